@@ -1,20 +1,42 @@
 from __future__ import annotations
+import datetime as dt
+import gzip
+import hashlib
+import io
 import os
 from pathlib import Path
 from flask import Flask, render_template, request, jsonify, redirect, url_for, render_template_string
 import pandas as pd
 
 from excel_dal import (
-    EXCEL_PATH, ensure_workbook,
+    EXCEL_PATH, ensure_workbook, cache_stats, data_version,
     read_goals, read_relationships,
     update_goal, add_goal, delete_goal,
-    toggle_link_goal,
+    toggle_link_goal, set_children, set_parents,
+    goal_graph, CycleError, per_version,
     WriteLockedError
 )
 
-from changelog_dal import read_changelog
+from changelog_dal import tail_changelog
+import view_models as vm
+import sankey_layout
+import mindmap_layout
+import gantt_index
+import tag_index
+import search_index
+import events
+import bulk_io
+import fragments
+import instrumentation
+import assets
+from instrumentation import timed
 
-app = Flask(__name__)
+# /static is served by assets.py (hashed URLs, precompressed variants)
+app = Flask(__name__, static_folder=None)
+instrumentation.init_app(app)
+assets.init_app(app)
+
+MINDMAP_LAYOUT = os.environ.get('KOKO_ROADMAP_MINDMAP_LAYOUT', 'server').strip().lower()
 
 
 @app.errorhandler(WriteLockedError)
@@ -48,335 +70,385 @@ def __routes():
     return '<pre>' + '\n'.join(sorted(str(r) for r in app.url_map.iter_rules())) + '</pre>'
 
 
+@app.get('/__cache')
+def __cache():
+    return jsonify({**cache_stats(), 'fragments': fragments.stats()})
+
+
+@app.get('/__metrics')
+def __metrics():
+    return instrumentation.metrics_text(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
 @app.before_request
 def _ensure_xlsx():
-    ensure_workbook()
-
-def _fmt_date_only(x):
-    if x in (None, '', pd.NaT):
-        return ''
-    try:
-        d = pd.to_datetime(x, errors='coerce')
-        if pd.isna(d): return ''
-        return d.date().isoformat()
-    except Exception:
-        return ''
+    with timed('ensure_workbook'):
+        ensure_workbook()
 
 @app.context_processor
 def inject_excel_path():
-    return dict(excel_path=str(Path(EXCEL_PATH).resolve()))
+    return dict(excel_path=str(Path(EXCEL_PATH).resolve()), data_version=data_version(), live_events=events.ENABLED)
+
+
+CHANGELOG_PAGE_SIZE = 50
 
 
 @app.get('/')
 def home():
-    # If you're using changelog_dal.py, prefer: from changelog_dal import read_changelog
-    # and call that instead of reading directly.
-    csv_path = Path(os.environ.get("KOKO_ROADMAP_CHANGELOG", "changelog.csv"))
-    if not csv_path.exists():
-        rows = []
-    else:
-        df = pd.read_csv(csv_path)
-        # normalise column names
-        cols = {c.lower(): c for c in df.columns}
-        # pick a sortable date col
-        if 'timestamp' in cols:
-            sortcol = cols['timestamp']
-        elif 'date' in cols:
-            sortcol = cols['date']
-        else:
-            sortcol = None
-        if sortcol:
-            df['_sort'] = pd.to_datetime(df[sortcol], errors='coerce')
-            df = df.sort_values('_sort', ascending=False).drop(columns=['_sort'])
-        rows = df.to_dict(orient='records')
-
-    return render_template('index.html', changelog=rows)
+    page = max(_int_arg('page', 1), 1)
+    rows, has_older = tail_changelog(CHANGELOG_PAGE_SIZE, (page - 1) * CHANGELOG_PAGE_SIZE)
+    return render_template('index.html', changelog=rows, page=page, has_older=has_older)
+
+
+GOALS_PAGE_SIZE = 100
+GOALS_MAX_PAGE_SIZE = 1000
 
+@per_version
+@timed('view_model')
+def _goal_table() -> pd.DataFrame:
+    return vm.goal_rows_frame(read_goals(), read_relationships())
+
+def _int_arg(name: str, default: int) -> int:
+    try:
+        return int(request.args.get(name, default))
+    except ValueError:
+        return default
+
+def _tag_args() -> tuple[tuple, str]:
+    """(?tags=a,b as a tuple, ?mode=any|all) for the tag filter shared by all views."""
+    mode = request.args.get('mode', 'any')
+    return tuple(_csv_arg('tags')), mode if mode in tag_index.MODES else 'any'
+
+def _tag_filter_ctx() -> dict:
+    # For templates/_tag_filter.html; other query args are carried through the form
+    tags, mode = _tag_args()
+    keep = {k: v for k, v in request.args.items() if k not in ('tags', 'mode', 'page')}
+    return dict(tags=list(tags), mode=mode, all=tag_index.tag_index().tags(), keep=keep)
+
+@timed('view_model')
+def _goals_query() -> dict:
+    """One page of the goals table from ?page=&limit=&sort=&order=asc|desc&f_<column>=text&tags=&mode=."""
+    limit = min(max(_int_arg('limit', GOALS_PAGE_SIZE), 1), GOALS_MAX_PAGE_SIZE)
+    page = max(_int_arg('page', 1), 1)
+    sort = request.args.get('sort', 'id')
+    if sort not in vm.GOAL_TABLE_COLUMNS:
+        sort = 'id'
+    desc = request.args.get('order') == 'desc'
+    filters = {k[2:]: v.strip() for k, v in request.args.items() if k.startswith('f_') and v.strip()}
+    tags, mode = _tag_args()
+    rows, total = vm.query_goal_rows(_goal_table(), filters, sort, desc, page, limit,
+                                     ids=tag_index.goal_ids(tags, mode))
+    return dict(items=rows, total=total, page=page, limit=limit, pages=max(-(-total // limit), 1),
+                sort=sort, order='desc' if desc else 'asc', filters=filters, tags=list(tags), mode=mode)
 
 @app.get('/goals')
 def goals():
-    gs = read_goals().copy()
-    # Show ALL goals by default - no filtering
-    # Filter out rows where id is NaN or None
-    if not gs.empty:
-        gs = gs[gs['id'].notna()]
-    rels = read_relationships()
-    
-    # Build parent/child relationships
-    children_by_parent = {}
-    parents_by_child = {}
-    if not rels.empty:
-        for _, r in rels.iterrows():
-            parent_id = r.get('parent_id')
-            child_id = r.get('child_id')
-            if pd.notna(parent_id) and pd.notna(child_id):
-                parent_id = int(parent_id)
-                child_id = int(child_id)
-                if parent_id not in children_by_parent:
-                    children_by_parent[parent_id] = []
-                children_by_parent[parent_id].append(child_id)
-                if child_id not in parents_by_child:
-                    parents_by_child[child_id] = []
-                parents_by_child[child_id].append(parent_id)
-    
-    # Build goal lookup
-    goal_by_id = {}
-    if not gs.empty:
-        for _, r in gs.iterrows():
-            goal_id = int(r['id'])
-            goal_by_id[goal_id] = r.get('name', '')
-    
-    rows = []
-    for _, r in gs.iterrows():
-        try:
-            goal_id = r.get('id')
-            if pd.isna(goal_id) or goal_id is None:
-                continue
-            goal_id = int(goal_id)
-            display_val = r.get('display')
-            # Convert to Yes/No: 1 or NaN = Yes, 0 = No
-            display_text = 'No' if (pd.notna(display_val) and int(display_val) == 0) else 'Yes'
-            
-            # Get children and parents
-            children_ids = children_by_parent.get(goal_id, [])
-            children_names = [goal_by_id.get(cid, '') for cid in children_ids if cid in goal_by_id]
-            parent_ids = parents_by_child.get(goal_id, [])
-            parent_names = [goal_by_id.get(pid, '') for pid in parent_ids if pid in goal_by_id]
-            
-            rows.append(dict(
-                id=goal_id,
-                name=r.get('name',''),
-                start_date=r.get('start_date',''),
-                start_date_disp=_fmt_date_only(r.get('start_date','')),
-                due_date=r.get('due_date',''),
-                due_date_disp=_fmt_date_only(r.get('due_date','')),
-                description='' if (pd.isna(r.get('description')) or str(r.get('description')).lower()=='nan') else r.get('description',''),
-                display=display_text,
-                display_value=int(display_val) if pd.notna(display_val) else 1,  # For form submission
-                tags=r.get('tags', '') if pd.notna(r.get('tags')) else '',
-                children_names=sorted([t for t in children_names if t]),
-                parent_names=sorted([t for t in parent_names if t])
-            ))
-        except Exception as e:
-            # Skip rows with errors, but log them
-            import sys
-            print(f"Error processing goal row: {e}", file=sys.stderr)
-            continue
-    
-    # Get all goals for parent/child selection
-    all_goals = []
-    if not gs.empty:
-        for _, r in gs.iterrows():
-            goal_id = r.get('id')
-            if pd.notna(goal_id):
-                all_goals.append(dict(id=int(goal_id), name=r.get('name','')))
-    
-    return render_template('goals.html', goals=rows, all_goals=all_goals)
+    listing = _goals_query()
+    args = request.args.to_dict()
+    def page_url(**kw):
+        return url_for('goals', **{**args, **kw})
+    return render_template('goals.html', goals=listing['items'], rows=fragments.goal_rows(listing['items']),
+                           listing=listing, page_url=page_url, tag_filter=_tag_filter_ctx())
+
+@app.get('/goals/rows')
+def goals_rows():
+    """Current table rows for ?ids=1,2 as data and rendered <tr>s, for patching /goals after an edit."""
+    try:
+        ids = [int(v) for v in _csv_arg('ids')]
+    except ValueError:
+        return jsonify(ok=False, error='ids must be a comma-separated list of ids'), 400
+    def build():
+        table = _goal_table()
+        rows = table[table['id'].isin(ids)].to_dict(orient='records')
+        return dict(rows=rows, html={r['id']: str(html) for r, html in zip(rows, fragments.goal_rows(rows))})
+    return _json_api(build)
+
+@app.get('/events')
+def events_stream():
+    """Server-Sent Events: one compact delta per edit (see events.py); ?since= or Last-Event-ID resumes."""
+    if not events.ENABLED:
+        return '', 204  # tells EventSource not to reconnect
+    since = request.headers.get('Last-Event-ID') or request.args.get('since') or None
+    resp = app.response_class(events.stream(since), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'  # keep proxies from buffering the stream
+    return resp
+
+
+@per_version
+@timed('view_model')
+def _mindmap_payload(with_positions: bool, tags: tuple = (), mode: str = 'any') -> dict:
+    gs = vm.visible_goals(read_goals())
+    tagged = tag_index.goal_ids(tags, mode)
+    if tagged is not None:
+        gs = gs[gs['id'].isin(tagged)]
+    edges = read_relationships()
+    if tagged is not None:
+        edges = edges[edges['parent_id'].isin(tagged) & edges['child_id'].isin(tagged)]
+    payload = dict(
+        goals=vm.goal_payload(gs, ['id', 'name', 'due', 'start', 'tags']),
+        # Edges for hierarchical flow: parent → child relationships
+        edges=vm.edge_list(edges)
+    )
+    if with_positions:
+        payload['positions'] = mindmap_layout.positions(tags, mode)
+    return payload
+
+def _date_arg(name: str) -> str:
+    """?name=YYYY-MM-DD normalised to ISO text ('' when absent); ValueError if malformed."""
+    v = request.args.get(name, '').strip()
+    return dt.date.fromisoformat(v).isoformat() if v else ''
+
+def _gantt_window() -> tuple[str, str]:
+    return _date_arg('from'), _date_arg('to')
+
+@per_version
+@timed('view_model')
+def _sankey_payload(tags: tuple = (), mode: str = 'any') -> dict:
+    gs = vm.visible_goals(read_goals())
+    return dict(
+        goals=vm.goal_payload(gs, ['id', 'name', 'due', 'tags']),
+        edges=vm.edge_list(read_relationships()),
+        tags=tag_index.tag_index().tags(set(gs['id'])),
+        tag_filter=dict(tags=list(tags), mode=mode),
+        # Layout for the initial ?tags= filter, ready to plot; other selections come from /api/sankey
+        layout=sankey_layout.layout((), tags, mode)
+    )
 
 
 @app.get('/mindmap')
 def mindmap():
-    # Data
-    gs = read_goals()
-    # Filter out goals where display is explicitly 0 (No), but keep NaN/null (default to Yes)
-    gs = gs[(gs['display'].isna()) | (gs['display'] != 0)]
-    rels = read_relationships()
-
-    # Goals payload
-    goals_rows = [] if gs.empty else [
-        dict(id=int(r['id']), name=r.get('name',''), due=_fmt_date_only(r.get('due_date','')), 
-             start=_fmt_date_only(r.get('start_date','')), tags=r.get('tags','') if pd.notna(r.get('tags')) else '')
-        for _, r in gs.iterrows()
-    ]
-
-    # Edges for hierarchical flow: parent → child relationships
-    edges = []
-    if not rels.empty:
-        for _, r in rels.iterrows():
-            parent_id = r.get('parent_id')
-            child_id = r.get('child_id')
-            if pd.notna(parent_id) and pd.notna(child_id):
-                edges.append(dict(parent=int(parent_id), child=int(child_id)))
-
-    payload = dict(
-        goals=goals_rows,
-        edges=edges
-    )
-    return render_template('mindmap.html', data=payload)
+    # 'server' ships precomputed positions (cytoscape preset layout); 'client' runs dagre in the browser
+    server_layout = request.args.get('layout', MINDMAP_LAYOUT) == 'server'
+    return render_template('mindmap.html', data=_mindmap_payload(server_layout, *_tag_args()),
+                           tag_filter=_tag_filter_ctx())
 
 
 @app.get('/gantt')
 def gantt():
-    # Data
-    gs = read_goals()
-    # Filter out goals where display is explicitly 0 (No), but keep NaN/null (default to Yes)
-    gs = gs[(gs['display'].isna()) | (gs['display'] != 0)]
-    rels = read_relationships()
-
-    # Helpers
-    def _iso(x):  # ISO date ('' if blank/invalid)
-        return _fmt_date_only(x)
-
-    # Goals payload with dates
-    goals_rows = [] if gs.empty else [
-        dict(
-            id=int(r['id']), 
-            name=r.get('name',''), 
-            start=_iso(r.get('start_date','')), 
-            due=_iso(r.get('due_date','')), 
-            tags=r.get('tags','') if pd.notna(r.get('tags')) else ''
-        )
-        for _, r in gs.iterrows()
-    ]
-
-    # Build parent-child relationships for grouping
-    children_by_parent = {}
-    parent_by_child = {}
-    if not rels.empty:
-        for _, r in rels.iterrows():
-            parent_id = r.get('parent_id')
-            child_id = r.get('child_id')
-            if pd.notna(parent_id) and pd.notna(child_id):
-                parent_id = int(parent_id)
-                child_id = int(child_id)
-                if parent_id not in children_by_parent:
-                    children_by_parent[parent_id] = []
-                children_by_parent[parent_id].append(child_id)
-                parent_by_child[child_id] = parent_id
-
-    payload = dict(
-        goals=goals_rows,
-        relationships=dict(
-            children_by_parent=children_by_parent,
-            parent_by_child=parent_by_child
-        )
-    )
-    return render_template('gantt.html', data=payload)
+    # ?from=&to= (ISO dates) ship only the goals whose bars overlap that window
+    try:
+        lo, hi = _gantt_window()
+    except ValueError:
+        lo = hi = ''
+    return render_template('gantt.html', data=gantt_index.payload(lo, hi, *_tag_args()),
+                           tag_filter=_tag_filter_ctx())
 
 
 @app.get('/sankey')
 def sankey():
-    # Data
+    height = int(request.args.get('h', '900'))
+    return render_template('sankey.html', data=_sankey_payload(*_tag_args()), height=height)
+
+
+# ----- JSON data API -----
+# Responses carry a strong ETag derived from the data version and the request
+# URL; a matching If-None-Match gets a 304 without rebuilding anything. Larger
+# bodies are gzip-compressed when the client accepts it.
+GZIP_MIN_BYTES = 1024
+
+def _json_api(build):
+    tag = hashlib.sha1(f'{data_version()}|{request.full_path}'.encode()).hexdigest()
+    gz = 'gzip' in request.accept_encodings
+    matched = next((t for t in (tag + '-gz', tag) if request.if_none_match.contains(t)), None)
+    if matched:
+        resp = app.response_class(status=304)
+        resp.set_etag(matched)
+    else:
+        resp = jsonify(build())
+        body = resp.get_data()
+        if gz and len(body) >= GZIP_MIN_BYTES:
+            resp.set_data(gzip.compress(body, compresslevel=6))
+            resp.headers['Content-Encoding'] = 'gzip'
+            tag += '-gz'
+        resp.set_etag(tag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.vary.add('Accept-Encoding')
+    return resp
+
+def _csv_arg(name: str) -> list[str]:
+    return [v.strip() for v in request.args.get(name, '').split(',') if v.strip()]
+
+@app.get('/api/goals')
+def api_goals():
+    """All goal rows; with ?page= or ?limit= a page envelope (same parameters as /goals)."""
+    if 'page' in request.args or 'limit' in request.args:
+        return _json_api(_goals_query)
+    ids = tag_index.goal_ids(*_tag_args())
+    if ids is not None:
+        return _json_api(lambda: _goal_table().pipe(lambda t: t[t['id'].isin(ids)]).to_dict(orient='records'))
+    return _json_api(lambda: _goal_table().to_dict(orient='records'))
+
+@app.get('/api/relationships')
+def api_relationships():
+    return _json_api(lambda: vm.edge_list(read_relationships()))
+
+@app.get('/api/mindmap')
+def api_mindmap():
+    server_layout = request.args.get('layout', MINDMAP_LAYOUT) == 'server'
+    return _json_api(lambda: _mindmap_payload(server_layout, *_tag_args()))
+
+@app.get('/api/gantt')
+def api_gantt():
+    """Gantt data; ?from=&to= (YYYY-MM-DD, either optional) keep only goals overlapping that window."""
+    try:
+        lo, hi = _gantt_window()
+    except ValueError:
+        return jsonify(ok=False, error='from/to must be dates as YYYY-MM-DD'), 400
+    return _json_api(lambda: gantt_index.payload(lo, hi, *_tag_args()))
+
+@app.get('/api/sankey')
+def api_sankey():
+    """Sankey layout for ?goals=1,2,3&tags=a,b (both optional), cached per data version."""
+    try:
+        goal_ids = tuple(int(v) for v in _csv_arg('goals'))
+    except ValueError:
+        return jsonify(ok=False, error='goals must be a comma-separated list of ids'), 400
+    tags, mode = _tag_args()
+    return _json_api(lambda: sankey_layout.layout(goal_ids, tags, mode))
+
+@timed('view_model')
+def _hierarchy_payload(goal_id: int, depth: int | None, up: bool) -> dict:
+    """Goals within `depth` links below (or above) goal_id, from the cached reachability index."""
+    graph = goal_graph()
+    dist, more = graph.levels(goal_id, depth, up)
     gs = read_goals()
-    # Filter out goals where display is explicitly 0 (No), but keep NaN/null (default to Yes)
-    gs = gs[(gs['display'].isna()) | (gs['display'] != 0)]
-    rels = read_relationships()
-
-    # Helpers
-    def _iso(x):  # ISO date ('' if blank/invalid)
-        return _fmt_date_only(x)
-
-    # Goals payload
-    goals_rows = [] if gs.empty else [
-        dict(id=int(r['id']), name=r.get('name',''), due=_iso(r.get('due_date','')), tags=r.get('tags','') if pd.notna(r.get('tags')) else '')
-        for _, r in gs.iterrows()
-    ]
-
-    # Edges for hierarchical flow: parent → child relationships
-    edges = []
-    if not rels.empty:
-        for _, r in rels.iterrows():
-            parent_id = r.get('parent_id')
-            child_id = r.get('child_id')
-            if pd.notna(parent_id) and pd.notna(child_id):
-                edges.append(dict(parent=int(parent_id), child=int(child_id)))
-
-    # Extract unique tags from all goals
-    all_tags = set()
-    if not gs.empty:
-        for _, r in gs.iterrows():
-            tags_str = r.get('tags', '')
-            if pd.notna(tags_str) and tags_str:
-                # Split by comma and clean up
-                tags = [t.strip() for t in str(tags_str).split(',') if t.strip()]
-                all_tags.update(tags)
-    
-    tags_list = sorted(list(all_tags))
-
-    payload = dict(
-        goals=goals_rows,
+    rows = sorted(graph.row[i] for i in dist if i in graph.row)
+    goals = vm.goal_payload(vm.visible_goals(gs.iloc[rows]), ['id', 'name', 'start', 'due', 'tags'])
+    shown = {g['id'] for g in goals}
+    for g in goals:
+        g['level'] = dist[g['id']]
+    edges = [dict(parent=p, child=c) for p in sorted(shown) for c in sorted(graph.children_of(p)) if c in shown]
+    return dict(
+        goal=goal_id,
+        depth=depth,
+        goals=goals,
         edges=edges,
-        tags=tags_list
+        # Goals at the depth limit with more links beyond it, for the next lazy expansion
+        truncated=sorted(more & shown),
+        total=len(graph.ancestors(goal_id) if up else graph.descendants(goal_id)),
     )
-    height = int(request.args.get('h', '900'))
-    return render_template('sankey.html', data=payload, height=height)
+
+def _hierarchy_api(goal_id: int, up: bool):
+    v = request.args.get('depth', '').strip()
+    try:
+        depth = int(v) if v else None
+        if depth is not None and depth < 0:
+            raise ValueError(v)
+    except ValueError:
+        return jsonify(ok=False, error='depth must be a non-negative integer'), 400
+    if goal_id not in goal_graph():
+        return jsonify(ok=False, error='Goal not found'), 404
+    return _json_api(lambda: _hierarchy_payload(goal_id, depth, up))
+
+@app.get('/api/goals/<int:goal_id>/subtree')
+def api_goal_subtree(goal_id: int):
+    """Goals below goal_id, ?depth=N levels deep (default: all of them)."""
+    return _hierarchy_api(goal_id, up=False)
+
+@app.get('/api/goals/<int:goal_id>/ancestors')
+def api_goal_ancestors(goal_id: int):
+    """Goals above goal_id, ?depth=N levels up (default: all of them)."""
+    return _hierarchy_api(goal_id, up=True)
+
+@app.get('/api/search')
+def api_search():
+    """Goals matching ?q= (prefix matching on every word, best first), at most ?limit= of them."""
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 200)
+    except ValueError:
+        return jsonify(ok=False, error='limit must be an integer'), 400
+    q = request.args.get('q', '')
+    return _json_api(lambda: dict(query=q, results=search_index.search(q, limit)))
+
+@app.get('/api/tags')
+def api_tags():
+    """Every tag with the number of goals carrying it."""
+    return _json_api(lambda: tag_index.tag_index().counts())
+
+
+# ----- Bulk import / export (see bulk_io.py) -----
+@app.get('/export')
+def export():
+    """Every goal and link as ?format=csv|jsonl, streamed as it is serialised."""
+    fmt = request.args.get('format', 'csv')
+    if fmt not in bulk_io.FORMATS:
+        return jsonify(ok=False, error='format must be csv or jsonl'), 400
+    resp = app.response_class(bulk_io.export(fmt), mimetype=bulk_io.MEDIA_TYPES[fmt])
+    resp.headers['Content-Disposition'] = f'attachment; filename=roadmap.{fmt}'
+    return resp
+
+@app.post('/import')
+def import_goals():
+    """Add the goals and links of a CSV/JSONL upload (form field `file`, or the raw body) in one write."""
+    upload = request.files.get('file')
+    raw = upload.stream if upload else request.stream
+    fmt = request.args.get('format') or bulk_io.format_for(upload.filename if upload else request.mimetype)
+    if fmt not in bulk_io.FORMATS:
+        return jsonify(ok=False, error='format must be csv or jsonl'), 400
+    try:
+        result = bulk_io.import_file(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''), fmt)
+    except bulk_io.BulkImportError as e:
+        return jsonify(ok=False, error=str(e), errors=e.errors), 400
+    except UnicodeDecodeError:
+        return jsonify(ok=False, error='The file must be UTF-8 text'), 400
+    except WriteLockedError as e:
+        return jsonify(ok=False, error=str(e)), 423
+    return jsonify(ok=True, **result), 200
 
 
 # ----- Linking UIs -----
+def _goal_row(gs: pd.DataFrame, graph, goal_id: int):
+    """The goal's row via the graph's id→row index (None if unknown)."""
+    i = graph.row.get(goal_id)
+    if i is None or i >= len(gs) or gs.iloc[i]['id'] != goal_id:
+        # Frame and graph come from different data versions; fall back to a scan
+        g = gs[gs['id'] == goal_id]
+        return None if g.empty else g.iloc[0]
+    return gs.iloc[i]
+
 @app.get('/links/goal/<int:goal_id>')
 def links_goal(goal_id: int):
     gs = read_goals()
-    rels = read_relationships()
-    g = gs[gs['id']==goal_id]
-    if g.empty: return redirect(url_for('goals'))
-    
-    # Get current children
-    linked_children = set()
-    if not rels.empty:
-        linked_children = set(rels[rels['parent_id']==goal_id]['child_id'].tolist())
+    graph = goal_graph()
+    g = _goal_row(gs, graph, goal_id)
+    if g is None: return redirect(url_for('goals'))
     
-    # Get all goals except self
-    all_goals = gs[gs['id'] != goal_id].sort_values(['name']).to_dict(orient='records')
-    
-    return render_template_string("""
-    {% extends 'base.html' %}{% block content %}
-    <h2>Link Children to Goal: {{ g.name }}</h2>
-    <form method="post">
-      {% for r in rows %}
-        <div><label><input type="checkbox" name="child_id" value="{{ r.id }}" {% if r.id in linked %}checked{% endif %}> {{ r.name }}</label></div>
-      {% endfor %}
-      <div class="actions" style="margin-top:.75rem"><button class="btn primary">Save</button></div>
-    </form>
-    {% endblock %}
-    """, g=dict(id=int(g.iloc[0]['id']), name=g.iloc[0]['name']), rows=all_goals, linked=linked_children)
+    return render_template('links.html', title='Children', g=dict(id=goal_id, name=g['name']),
+                           choices=fragments.link_choices('child_id', goal_id, graph.children_of(goal_id)))
 
 @app.post('/links/goal/<int:goal_id>')
 def links_goal_post(goal_id: int):
-    gs = read_goals()
     submitted = set([int(x) for x in request.form.getlist('child_id')])
-    all_ids = set(gs['id'].tolist()) if not gs.empty else set()
+    all_ids = goal_graph().ids()
     # Remove self from all_ids
     all_ids.discard(goal_id)
-    for child_id in all_ids:
-        toggle_link_goal(goal_id, child_id, child_id in submitted)
+    try:
+        set_children(goal_id, submitted & all_ids)
+    except CycleError as e:
+        return str(e), 400
     return redirect(url_for('goals'))
 
 @app.get('/links/parents/<int:goal_id>')
 def links_parents(goal_id: int):
     gs = read_goals()
-    rels = read_relationships()
-    g = gs[gs['id']==goal_id]
-    if g.empty: return redirect(url_for('goals'))
-    
-    # Get current parents
-    linked_parents = set()
-    if not rels.empty:
-        linked_parents = set(rels[rels['child_id']==goal_id]['parent_id'].tolist())
+    graph = goal_graph()
+    g = _goal_row(gs, graph, goal_id)
+    if g is None: return redirect(url_for('goals'))
     
-    # Get all goals except self
-    all_goals = gs[gs['id'] != goal_id].sort_values(['name']).to_dict(orient='records')
-    
-    return render_template_string("""
-    {% extends 'base.html' %}{% block content %}
-    <h2>Link Parents to Goal: {{ g.name }}</h2>
-    <form method="post">
-      {% for r in rows %}
-        <div><label><input type="checkbox" name="parent_id" value="{{ r.id }}" {% if r.id in linked %}checked{% endif %}> {{ r.name }}</label></div>
-      {% endfor %}
-      <div class="actions" style="margin-top:.75rem"><button class="btn primary">Save</button></div>
-    </form>
-    {% endblock %}
-    """, g=dict(id=int(g.iloc[0]['id']), name=g.iloc[0]['name']), rows=all_goals, linked=linked_parents)
+    return render_template('links.html', title='Parents', g=dict(id=goal_id, name=g['name']),
+                           choices=fragments.link_choices('parent_id', goal_id, graph.parents_of(goal_id)))
 
 @app.post('/links/parents/<int:goal_id>')
 def links_parents_post(goal_id: int):
-    gs = read_goals()
     submitted = set([int(x) for x in request.form.getlist('parent_id')])
-    all_ids = set(gs['id'].tolist()) if not gs.empty else set()
+    all_ids = goal_graph().ids()
     # Remove self from all_ids
     all_ids.discard(goal_id)
-    for parent_id in all_ids:
-        toggle_link_goal(parent_id, goal_id, parent_id in submitted)
+    try:
+        set_parents(goal_id, submitted & all_ids)
+    except CycleError as e:
+        return str(e), 400
     return redirect(url_for('goals'))
 
 
@@ -384,13 +456,17 @@ def links_parents_post(goal_id: int):
 @app.post('/goals/<int:goal_id>/add-parent/<int:parent_id>')
 def goals_add_parent(goal_id: int, parent_id: int):
     """Add a single parent relationship."""
-    gs = read_goals()
+    graph = goal_graph()
     # Validate that both goals exist
-    if gs.empty or goal_id not in gs['id'].values or parent_id not in gs['id'].values:
+    if goal_id not in graph or parent_id not in graph:
         return jsonify(ok=False, error='Invalid goal ID'), 400
     # Prevent self-reference
     if goal_id == parent_id:
         return jsonify(ok=False, error='A goal cannot be its own parent'), 400
+    try:
+        graph.check_link(parent_id, goal_id)
+    except CycleError as e:
+        return jsonify(ok=False, error=str(e)), 400
     try:
         toggle_link_goal(parent_id, goal_id, True)
     except WriteLockedError as e:
@@ -402,13 +478,17 @@ def goals_add_parent(goal_id: int, parent_id: int):
 @app.post('/goals/<int:goal_id>/add-child/<int:child_id>')
 def goals_add_child(goal_id: int, child_id: int):
     """Add a single child relationship."""
-    gs = read_goals()
+    graph = goal_graph()
     # Validate that both goals exist
-    if gs.empty or goal_id not in gs['id'].values or child_id not in gs['id'].values:
+    if goal_id not in graph or child_id not in graph:
         return jsonify(ok=False, error='Invalid goal ID'), 400
     # Prevent self-reference
     if goal_id == child_id:
         return jsonify(ok=False, error='A goal cannot be its own child'), 400
+    try:
+        graph.check_link(goal_id, child_id)
+    except CycleError as e:
+        return jsonify(ok=False, error=str(e)), 400
     try:
         toggle_link_goal(goal_id, child_id, True)
     except WriteLockedError as e:
@@ -491,13 +571,9 @@ def goals_edit_inline(goal_id: int):
 
 @app.post('/goals/<int:goal_id>/delete-inline')
 def goals_delete_inline(goal_id: int):
-    rels = read_relationships()
     # Check if goal has children or is a child
-    if not rels.empty:
-        has_children = (rels['parent_id'] == int(goal_id)).any()
-        is_child = (rels['child_id'] == int(goal_id)).any()
-        if has_children or is_child:
-            return jsonify(ok=False, error='Cannot delete: goal is linked to other goals as parent or child.'), 400
+    if goal_graph().is_linked(goal_id):
+        return jsonify(ok=False, error='Cannot delete: goal is linked to other goals as parent or child.'), 400
     try:
         delete_goal(goal_id)
     except WriteLockedError as e:
@@ -0,0 +1,249 @@
+"""Front-end assets served from /static with content-hashed URLs, precompressed variants and immutable caching.
+
+The JS/CSS libraries the views use are pinned in VENDOR and committed under
+static/vendor/, with their sha256 in static/vendor/SHA256SUMS, so pages load
+without reaching a CDN:
+
+    python assets.py fetch    # download the pinned libraries into static/vendor/ (once, where there is network)
+    python assets.py build    # check them, then write .gz (and .br, if brotli is installed) next to each static file
+
+Templates link assets with asset_url('style.css') -> /static/style.<hash>.css.
+A URL carrying the file's current hash is served with a one-year immutable
+Cache-Control, as the .br or .gz variant when the client accepts it; any other
+/static URL is served with no-cache, so it is revalidated.
+
+A library present but not matching SHA256SUMS stops the app from starting and
+`build` from succeeding. One not fetched yet is loaded from its CDN URL, with a
+warning at startup and from `build`, until static/vendor/ is committed.
+"""
+from __future__ import annotations
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import sys
+import threading
+import urllib.request
+from pathlib import Path
+
+from flask import abort, request, send_file, url_for
+from werkzeug.security import safe_join
+
+try:  # optional; without it only .gz variants are built
+    import brotli
+except ImportError:
+    brotli = None
+
+STATIC_DIR = Path(__file__).resolve().parent / 'static'
+VENDOR = {
+    'vendor/plotly-2.27.0.min.js': 'https://cdn.plot.ly/plotly-2.27.0.min.js',
+    'vendor/cytoscape-3.27.0.min.js': 'https://cdn.jsdelivr.net/npm/cytoscape@3.27.0/dist/cytoscape.min.js',
+    'vendor/dagre-0.8.5.min.js': 'https://cdn.jsdelivr.net/npm/dagre@0.8.5/dist/dagre.min.js',
+    'vendor/cytoscape-dagre-2.5.0.min.js': 'https://cdn.jsdelivr.net/npm/cytoscape-dagre@2.5.0/cytoscape-dagre.min.js',
+    'vendor/frappe-gantt-0.6.1.min.js': 'https://cdn.jsdelivr.net/npm/frappe-gantt@0.6.1/dist/frappe-gantt.min.js',
+    'vendor/frappe-gantt-0.6.1.css': 'https://cdn.jsdelivr.net/npm/frappe-gantt@0.6.1/dist/frappe-gantt.css',
+}
+SUMS = 'vendor/SHA256SUMS'  # `sha256sum -c` format, relative to static/
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Preferred first; each is used only if the client accepts it and the variant is current
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+COMPRESS_MIN_BYTES = 1024
+HASH_LEN = 12
+_HASHED = re.compile(rf'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{{{HASH_LEN}}})(?P<ext>\.[^./]+)$')
+
+# path -> (stat key, digest); re-hashed when the file changes (e.g. while developing)
+_hashes: dict[str, tuple] = {}
+_lock = threading.Lock()
+
+
+class MissingAssetError(RuntimeError):
+    pass
+
+
+def content_hash(path: str) -> str | None:
+    """Short sha256 of a file under static/, or None if there is no such file."""
+    full = safe_join(str(STATIC_DIR), path)
+    try:
+        st = os.stat(full) if full else None
+    except FileNotFoundError:
+        st = None
+    if st is None:
+        return None
+    key = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        hit = _hashes.get(path)
+    if hit is not None and hit[0] == key:
+        return hit[1]
+    digest = hashlib.sha256(Path(full).read_bytes()).hexdigest()[:HASH_LEN]
+    with _lock:
+        _hashes[path] = (key, digest)
+    return digest
+
+
+def asset_url(path: str) -> str:
+    """URL for a file under static/ that changes whenever its content does (Jinja global)."""
+    digest = content_hash(path)
+    if digest is None:
+        return VENDOR.get(path) or url_for('static', filename=path)  # a library not fetched yet: its CDN
+    stem, ext = os.path.splitext(path)
+    return url_for('static', filename=f'{stem}.{digest}{ext}')
+
+
+def serve(filename: str):
+    """The /static/<filename> view: hashed names are immutable, variants follow Accept-Encoding."""
+    m = _HASHED.match(filename)
+    path = m['stem'] + m['ext'] if m else filename
+    full = safe_join(str(STATIC_DIR), path)
+    if full is None or not os.path.isfile(full):
+        abort(404)
+    immutable = m is not None and m['hash'] == content_hash(path)
+    body, encoding = full, None
+    mtime = os.stat(full).st_mtime_ns
+    for name, suffix in ENCODINGS:
+        variant = full + suffix
+        if name in request.accept_encodings and os.path.isfile(variant) and os.stat(variant).st_mtime_ns >= mtime:
+            body, encoding = variant, name
+            break
+    resp = send_file(body, mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream', conditional=True)
+    if encoding:
+        resp.headers['Content-Encoding'] = encoding
+    resp.vary.add('Accept-Encoding')
+    resp.headers['Cache-Control'] = IMMUTABLE if immutable else 'no-cache'
+    return resp
+
+
+def init_app(app):
+    """Serve /static through serve() and make asset_url() available to templates.
+
+    MissingAssetError if a VENDOR file does not match SHA256SUMS; one not fetched yet is only warned about.
+    """
+    _check_vendor()
+    app.add_url_rule('/static/<path:filename>', endpoint='static', view_func=serve)
+    app.jinja_env.globals['asset_url'] = asset_url
+
+
+# ----- VENDOR PINS -----
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def read_sums() -> dict[str, str]:
+    """path -> sha256 recorded in SUMS ({} before the first fetch)."""
+    try:
+        lines = (STATIC_DIR / SUMS).read_text(encoding='utf-8').splitlines()
+    except FileNotFoundError:
+        return {}
+    sums = {}
+    for line in lines:
+        digest, _, path = line.strip().partition('  ')
+        if path:
+            sums[path] = digest
+    return sums
+
+
+def _write_sums(sums: dict[str, str]):
+    target = STATIC_DIR / SUMS
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + '.tmp')
+    tmp.write_text(''.join(f'{sums[p]}  {p}\n' for p in sorted(sums)), encoding='utf-8')
+    os.replace(tmp, target)
+
+
+def missing_vendor() -> list[str]:
+    """The VENDOR paths not fetched into static/ yet (served from their CDN URLs meanwhile)."""
+    return [path for path in VENDOR if not (STATIC_DIR / path).is_file()]
+
+
+def vendor_problems() -> list[str]:
+    """What is wrong with the VENDOR files present in static/vendor/: unrecorded in SUMS or not matching it."""
+    sums = read_sums()
+    problems = []
+    for path in VENDOR:
+        target = STATIC_DIR / path
+        if not target.is_file():
+            continue
+        if path not in sums:
+            problems.append(f'static/{path} has no sha256 in static/{SUMS}')
+        elif _sha256(target.read_bytes()) != sums[path]:
+            problems.append(f'static/{path} does not match its sha256 in static/{SUMS}')
+    return problems
+
+
+def _check_vendor():
+    problems = vendor_problems()
+    if problems:
+        raise MissingAssetError('\n'.join([*problems, 'Run `python assets.py fetch` where there is network and commit static/vendor/.']))
+    for path in missing_vendor():
+        logging.getLogger(__name__).warning('static/%s is not fetched yet; loading it from %s. Run `python assets.py fetch` '
+                                            'and commit static/vendor/.', path, VENDOR[path])
+
+
+# ----- BUILD STEPS -----
+
+def fetch(force: bool = False) -> list[str]:
+    """Download the VENDOR libraries not yet present and matching SUMS (all of them with force=True); record their sha256.
+
+    A download that does not match a sha256 already in SUMS is refused:
+    delete its line to accept a changed file deliberately.
+    """
+    recorded = read_sums()
+    sums = dict(recorded)
+    done = []
+    try:
+        for path, url in VENDOR.items():
+            target = STATIC_DIR / path
+            if not force and target.is_file() and sums.get(path) == _sha256(target.read_bytes()):
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with urllib.request.urlopen(url, timeout=60) as r:
+                data = r.read()
+            digest = _sha256(data)
+            if sums.get(path, digest) != digest:
+                raise MissingAssetError(f'{url} does not match the sha256 pinned in static/{SUMS}')
+            tmp = target.with_name(target.name + '.tmp')
+            tmp.write_bytes(data)
+            os.replace(tmp, target)
+            sums[path] = digest
+            done.append(path)
+    finally:
+        sums = {p: d for p, d in sums.items() if p in VENDOR}
+        if sums != recorded:
+            _write_sums(sums)
+    return done
+
+
+def build() -> list[str]:
+    """Check the VENDOR files, then write a .gz (and .br) variant next to every compressible static file lacking a current one."""
+    _check_vendor()
+    written = []
+    for f in sorted(STATIC_DIR.rglob('*')):
+        if not f.is_file() or f.suffix in ('.gz', '.br') or f.stat().st_size < COMPRESS_MIN_BYTES:
+            continue
+        if not (mimetypes.guess_type(f.name)[0] or '').startswith(('text/', 'application/javascript', 'application/json', 'image/svg')):
+            continue
+        data = None
+        for suffix, compress in (('.gz', lambda b: gzip.compress(b, compresslevel=9, mtime=0)),
+                                 ('.br', brotli and (lambda b: brotli.compress(b, quality=11)))):
+            variant = f.with_name(f.name + suffix)
+            if not compress or (variant.exists() and variant.stat().st_mtime_ns >= f.stat().st_mtime_ns):
+                continue
+            data = data if data is not None else f.read_bytes()
+            variant.write_bytes(compress(data))
+            written.append(str(variant.relative_to(STATIC_DIR)))
+    return written
+
+
+if __name__ == '__main__':
+    import argparse
+    ap = argparse.ArgumentParser(description='Fetch and precompress the static front-end assets.')
+    ap.add_argument('command', choices=['fetch', 'build'])
+    ap.add_argument('--force', action='store_true', help='fetch: download again even if present')
+    args = ap.parse_args()
+    try:
+        out = fetch(args.force) if args.command == 'fetch' else build()
+    except (MissingAssetError, OSError) as e:  # OSError: e.g. no network for fetch
+        sys.exit(str(e))
+    print('\n'.join(out) or 'nothing to do', file=sys.stderr)
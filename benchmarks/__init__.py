@@ -0,0 +1,6 @@
+"""Benchmarks for the data layer and the page routes.
+
+    python -m benchmarks.generate 1000 big.xlsx          # synthetic roadmap workbook
+    python -m benchmarks.run --sizes 100,1000 --out bench.json
+    python -m benchmarks.run --sizes 100,1000 --compare bench.json
+"""
@@ -0,0 +1,71 @@
+"""Synthetic roadmap workbooks at a given scale.
+
+Goals form a layered DAG: a handful of roots, each goal hanging under an
+earlier one with about `fanout` children per parent (so depth grows like
+log_fanout(n)), and a share of goals getting a second parent. Links always
+run from a lower id to a higher one, so the graph is acyclic by construction.
+"""
+from __future__ import annotations
+import argparse
+import datetime as dt
+import random
+
+import pandas as pd
+
+TAGS = ['platform', 'mobile', 'web', 'data', 'ml', 'infra', 'security', 'growth',
+        'ops', 'design', 'research', 'compliance', 'q1', 'q2', 'q3', 'q4']
+VERBS = ['Launch', 'Optimize', 'Migrate', 'Build', 'Scale', 'Retire', 'Automate', 'Harden']
+NOUNS = ['billing', 'search', 'onboarding', 'analytics', 'network', 'storage', 'playbooks', 'pipeline']
+
+
+def roadmap_frames(goals: int, seed: int = 0, fanout: int = 4, multi_parent: float = 0.1):
+    """(goals, relationships) DataFrames with the workbook's column layout."""
+    rng = random.Random(seed)
+    roots = max(1, goals // 50)
+    base = dt.date(2025, 1, 1)
+    rows, links = [], []
+    for i in range(1, goals + 1):
+        start = base + dt.timedelta(days=rng.randint(0, 1000))
+        due = start + dt.timedelta(days=rng.randint(14, 540))
+        rows.append({
+            'id': i,
+            'name': f'{rng.choice(VERBS)} {rng.choice(NOUNS)} {i}',
+            'due_date': '' if rng.random() < 0.10 else due.isoformat(),
+            'description': f'Synthetic goal {i} for benchmarking.',
+            'display': 0 if rng.random() < 0.05 else 1,
+            'tags': ', '.join(rng.sample(TAGS, rng.randint(0, 3))),
+            'start_date': '' if rng.random() < 0.15 else start.isoformat(),
+        })
+        if i <= roots:
+            continue
+        parent = min(i - 1, max(1, (i - 1) // fanout + rng.randint(-fanout, 0)))
+        links.append((parent, i))
+        if parent > 1 and rng.random() < multi_parent:
+            links.append((rng.randint(1, parent - 1), i))
+    gs = pd.DataFrame(rows)
+    rels = pd.DataFrame(links, columns=['parent_id', 'child_id']).drop_duplicates()
+    return gs, rels
+
+
+def generate(path: str, goals: int, seed: int = 0, fanout: int = 4, multi_parent: float = 0.1) -> dict:
+    """Write a roadmap workbook with `goals` goals to path. Returns row counts."""
+    gs, rels = roadmap_frames(goals, seed, fanout, multi_parent)
+    with pd.ExcelWriter(path, engine='openpyxl') as w:
+        gs.to_excel(w, sheet_name='goals', index=False)
+        rels.to_excel(w, sheet_name='relationships', index=False)
+    return dict(goals=len(gs), relationships=len(rels))
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Write a synthetic roadmap workbook.')
+    ap.add_argument('goals', type=int)
+    ap.add_argument('path', nargs='?', default='roadmap.xlsx')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--fanout', type=int, default=4)
+    ap.add_argument('--multi-parent', type=float, default=0.1, help='share of goals with a second parent')
+    args = ap.parse_args(argv)
+    print(generate(args.path, args.goals, args.seed, args.fanout, args.multi_parent))
+
+
+if __name__ == '__main__':
+    main()
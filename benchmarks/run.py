@@ -0,0 +1,192 @@
+"""Time the data layer and the page routes on synthetic roadmaps.
+
+Each size runs in its own process against a fresh generated workbook (and
+database, for KOKO_ROADMAP_BACKEND=sqlite), since the storage paths are read
+from the environment at import time. Results are written as JSON:
+
+    {"meta": {...}, "results": [{"name", "goals", "repeat", "min_ms", "median_ms", "mean_ms", "max_ms"}, ...]}
+
+Pass --compare with an earlier results file to print median ratios.
+"""
+from __future__ import annotations
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from benchmarks.generate import generate
+
+ROOT = Path(__file__).resolve().parent.parent
+ROUTES = ('/goals', '/mindmap', '/gantt', '/sankey')
+
+
+def _stats(name: str, goals: int, samples: list[float]) -> dict:
+    ms = [s * 1000 for s in samples]
+    return {
+        'name': name, 'goals': goals, 'repeat': len(ms),
+        'min_ms': round(min(ms), 3), 'median_ms': round(statistics.median(ms), 3),
+        'mean_ms': round(statistics.fmean(ms), 3), 'max_ms': round(max(ms), 3),
+    }
+
+
+def _time(fn, repeat: int, setup=None) -> list[float]:
+    """fn(i) timed `repeat` times; setup(i), if given, runs untimed before each call."""
+    samples = []
+    for i in range(repeat):
+        if setup is not None:
+            setup(i)
+        t = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - t)
+    return samples
+
+
+def _ok(resp):
+    if resp.status_code >= 400:
+        raise RuntimeError(f'{resp.request.method} {resp.request.path} -> {resp.status_code}')
+    return resp
+
+
+def run_worker(goals: int, repeat: int) -> list[dict]:
+    """All benchmarks against the workbook/database configured in the environment."""
+    import excel_dal as dal
+    import fragments
+    from app import app
+
+    client = app.test_client()
+    results = []
+
+    def bench(name, fn, setup=None):
+        results.append(_stats(name, goals, _time(fn, repeat, setup)))
+
+    dal.ensure_workbook()
+    gid = max(1, goals // 2)
+
+    # ----- data layer -----
+    bench('dal.read_goals.cold', lambda i: dal.read_goals(), setup=lambda i: dal.clear_cache())
+    bench('dal.read_goals.warm', lambda i: dal.read_goals())
+    bench('dal.update_goal', lambda i: dal.update_goal(gid, f'Renamed goal {i}', '2026-06-30', 'Benchmark edit'))
+    bench('dal.add_goal', lambda i: dal.add_goal(f'Benchmark goal {i}', '2026-06-30', 'Benchmark add'))
+    parent = dal.add_goal('Benchmark parent', None, '')
+    child = dal.add_goal('Benchmark child', None, '')
+    bench('dal.toggle_link_goal', lambda i: dal.toggle_link_goal(parent, child, i % 2 == 0))
+    doomed = []
+    bench('dal.delete_goal', lambda i: dal.delete_goal(doomed[i]),
+          setup=lambda i: doomed.append(dal.add_goal(f'Benchmark doomed {i}', None, '')))
+
+    # ----- routes -----
+    # warm: the data version is unchanged between calls, so mostly memo lookups;
+    # cold: sheets, per_version view models/layouts and rendered fragments all rebuilt;
+    # edited: one link toggled before each call, as a page load after someone's edit
+    def cold(i):
+        dal.clear_cache()
+        dal.clear_memos()
+        fragments.clear()
+
+    def edit(i):
+        dal.toggle_link_goal(parent, child, i % 2 == 0)
+
+    for path in ROUTES:
+        _ok(client.get(path))
+        bench(f'route.GET {path}', lambda i, p=path: _ok(client.get(p)))
+        bench(f'route.GET {path}.cold', lambda i, p=path: _ok(client.get(p)), setup=cold)
+        bench(f'route.GET {path}.edited', lambda i, p=path: _ok(client.get(p)), setup=edit)
+    bench('route.POST /links/goal/<id>',
+          lambda i: _ok(client.post(f'/links/goal/{parent}', data={'child_id': [child] if i % 2 == 0 else []})))
+    return results
+
+
+def _git_rev() -> str | None:
+    try:
+        out = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def _meta(args) -> dict:
+    import openpyxl
+    import pandas as pd
+    return {
+        'timestamp': dt.datetime.now().isoformat(timespec='seconds'),
+        'git': _git_rev(),
+        'backend': args.backend,
+        'write_behind': os.environ.get('KOKO_ROADMAP_WRITE_BEHIND', '0') == '1',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'pandas': pd.__version__,
+        'openpyxl': openpyxl.__version__,
+        'sizes': args.sizes,
+        'repeat': args.repeat,
+        'seed': args.seed,
+    }
+
+
+def run(args) -> dict:
+    report = {'meta': _meta(args), 'results': []}
+    with tempfile.TemporaryDirectory(prefix='roadmap-bench-') as tmp:
+        for n in args.sizes:
+            xlsx = os.path.join(tmp, f'roadmap-{n}.xlsx')
+            counts = generate(xlsx, n, seed=args.seed)
+            print(f'{n} goals / {counts["relationships"]} links ...', file=sys.stderr, flush=True)
+            env = dict(os.environ,
+                       KOKO_ROADMAP_XLSX=xlsx,
+                       KOKO_ROADMAP_DB=os.path.join(tmp, f'roadmap-{n}.db'),
+                       KOKO_ROADMAP_CHANGELOG=os.path.join(tmp, 'changelog.csv'),
+                       KOKO_ROADMAP_BACKEND=args.backend)
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.run', '--worker', str(n), '--repeat', str(args.repeat)],
+                                 cwd=ROOT, env=env, capture_output=True, text=True)
+            if out.returncode != 0:
+                sys.exit(f'benchmark worker failed for {n} goals:\n{out.stderr}')
+            report['results'].extend(json.loads(out.stdout.strip().splitlines()[-1]))
+    return report
+
+
+def compare(base: dict, new: dict) -> str:
+    """Text table of median times, old vs new, for benchmarks present in both reports."""
+    old = {(r['name'], r['goals']): r for r in base['results']}
+    lines = [f'{"benchmark":<34} {"goals":>6} {"base ms":>10} {"new ms":>10} {"ratio":>7}']
+    for r in new['results']:
+        b = old.get((r['name'], r['goals']))
+        if b is None:
+            continue
+        ratio = r['median_ms'] / b['median_ms'] if b['median_ms'] else float('inf')
+        lines.append(f'{r["name"]:<34} {r["goals"]:>6} {b["median_ms"]:>10.1f} {r["median_ms"]:>10.1f} {ratio:>6.2f}x')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description='Benchmark the roadmap data layer and routes.')
+    ap.add_argument('--sizes', default='100,1000', type=lambda s: [int(x) for x in s.split(',') if x],
+                    help='comma-separated goal counts (default: 100,1000)')
+    ap.add_argument('--repeat', type=int, default=5, help='timed calls per benchmark (default: 5)')
+    ap.add_argument('--seed', type=int, default=0)
+    ap.add_argument('--backend', choices=['xlsx', 'sqlite'], default=os.environ.get('KOKO_ROADMAP_BACKEND', 'xlsx'))
+    ap.add_argument('--out', help='write the JSON report here instead of stdout')
+    ap.add_argument('--compare', metavar='BASELINE', help='earlier JSON report to compare medians against')
+    ap.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.worker is not None:
+        print(json.dumps(run_worker(args.worker, args.repeat)))
+        return
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + '\n')
+    else:
+        print(text)
+    if args.compare:
+        print(compare(json.loads(Path(args.compare).read_text()), report), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
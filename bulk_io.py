@@ -0,0 +1,266 @@
+"""Bulk import and streaming export of goals and parent → child links, as CSV or JSONL.
+
+A file is a sequence of records, one per CSV row or JSON line, each a goal or a link:
+
+    {"type": "goal", "id": "A-1", "name": "Platform", "start_date": "2026-01-05", "due_date": "2026-06-30",
+     "description": "", "display": 1, "tags": "infra,q1"}
+    {"type": "link", "parent_id": "A-1", "child_id": 42}
+
+CSV files have the same fields as columns (COLUMNS, any order, unused ones may
+be left out). Without a `type`, a record naming parent_id/child_id is a link.
+A goal's `id` is only a key for links in the same file -- imported goals are
+given fresh ids -- and a link end names a goal from the file by that key, or
+else an existing goal by its id. Links may come before the goals they name.
+
+The whole file is checked in one streaming pass and nothing is written unless
+every record is valid; the goals and links are then added with a single write
+(excel_dal.add_goals). Exports use the same layout with the stored ids.
+
+    python bulk_io.py import goals.csv        # or goals.jsonl, or - for stdin with --format
+    python bulk_io.py export roadmap.jsonl    # or omit the path to write to stdout
+"""
+from __future__ import annotations
+import csv
+import datetime as dt
+import io
+import json
+import sys
+
+import pandas as pd
+
+import excel_dal as dal
+from instrumentation import timed
+
+FORMATS = ('csv', 'jsonl')
+COLUMNS = ['type', 'id', 'name', 'start_date', 'due_date', 'description', 'display', 'tags', 'parent_id', 'child_id']
+MEDIA_TYPES = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+MAX_ERRORS = 100
+EXPORT_BATCH = 500  # rows serialised per chunk of the export stream
+
+
+class BulkImportError(ValueError):
+    """The file was rejected; `errors` lists the problems, with line numbers where known."""
+
+    def __init__(self, errors: list[str]):
+        super().__init__(f'{len(errors)} problem(s) in the import file: {errors[0]}')
+        self.errors = errors
+
+
+def format_for(name: str | None, default: str = 'csv') -> str:
+    """'csv' or 'jsonl' from a file name or content type ('.ndjson'/'json' count as jsonl)."""
+    name = (name or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', 'json')):
+        return 'jsonl'
+    if name.endswith('csv'):
+        return 'csv'
+    return default
+
+
+# ----- READING -----
+
+def records(text, fmt: str):
+    """(line number, {field: value}) for each record of a text stream, read lazily."""
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, {(k or '').strip().lower(): v for k, v in row.items()}
+        return
+    for n, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            yield n, None
+            continue
+        yield n, rec if isinstance(rec, dict) else None
+
+
+def _text(v) -> str:
+    return '' if v is None else str(v).strip()
+
+
+def _date(v) -> str | None:
+    v = _text(v)
+    if not v:
+        return None
+    try:
+        return dt.date.fromisoformat(v[:10]).isoformat()
+    except ValueError:
+        d = pd.to_datetime(v, errors='coerce', format='mixed')  # e.g. 31/12/2026, as the loader accepts
+        if pd.isna(d):
+            raise ValueError(f'{v!r} is not a date') from None
+        return d.date().isoformat()
+
+
+def _display(v) -> int | None:
+    v = _text(v)
+    if not v:
+        return None
+    try:
+        return int(float(v))
+    except ValueError:
+        raise ValueError(f'display must be a number, not {v!r}') from None
+
+
+def _goal(rec: dict) -> dict:
+    name = _text(rec.get('name'))
+    if not name:
+        raise ValueError('name is required')
+    return dict(name=name, start_date=_date(rec.get('start_date')), due_date=_date(rec.get('due_date')),
+                description=_text(rec.get('description')), display=_display(rec.get('display')),
+                tags=_text(rec.get('tags')))
+
+
+@timed('bulk_validate')
+def plan(stream, existing: set[int]) -> tuple[list[dict], list[tuple[int, int]], dict[str, int]]:
+    """Validate a record stream against the `existing` goal ids.
+
+    Returns (goals, links, keys) in excel_dal.add_goals form plus each file key's
+    position in goals, or raises BulkImportError listing every problem found.
+    """
+    goals: list[dict] = []
+    keys: dict[str, int] = {}
+    raw_links: list[tuple[int, str, str]] = []
+    errors: list[str] = []
+    for line, rec in stream:
+        if len(errors) >= MAX_ERRORS:
+            errors.append(f'stopped after {MAX_ERRORS} problems')
+            break
+        if rec is None:
+            errors.append(f'line {line}: not a JSON object')
+            continue
+        kind = _text(rec.get('type')).lower()
+        if not kind:
+            kind = 'link' if _text(rec.get('parent_id')) or _text(rec.get('child_id')) else 'goal'
+        if kind == 'link':
+            parent, child = _text(rec.get('parent_id')), _text(rec.get('child_id'))
+            if not parent or not child:
+                errors.append(f'line {line}: a link needs both parent_id and child_id')
+            else:
+                raw_links.append((line, parent, child))
+        elif kind == 'goal':
+            try:
+                goal = _goal(rec)
+            except ValueError as e:
+                errors.append(f'line {line}: {e}')
+                continue
+            key = _text(rec.get('id'))
+            if key:
+                if key in keys:
+                    errors.append(f'line {line}: duplicate goal id {key!r}')
+                    continue
+                keys[key] = len(goals)
+            goals.append(goal)
+        else:
+            errors.append(f'line {line}: unknown type {kind!r} (expected goal or link)')
+
+    def resolve(ref: str) -> int:
+        # Batch goals are -1, -2, ... (see excel_dal.add_goals)
+        if ref in keys:
+            return -keys[ref] - 1
+        try:
+            gid = int(ref)
+        except ValueError:
+            gid = None
+        if gid not in existing:
+            raise ValueError(f'unknown goal {ref!r}')
+        return gid
+
+    links = []
+    for line, parent, child in raw_links:
+        if len(errors) >= MAX_ERRORS:
+            break
+        try:
+            p, c = resolve(parent), resolve(child)
+        except ValueError as e:
+            errors.append(f'line {line}: {e}')
+            continue
+        if p == c:
+            errors.append(f'line {line}: a goal cannot be linked to itself')
+            continue
+        links.append((p, c))
+    if errors:
+        raise BulkImportError(errors)
+    return goals, links, keys
+
+
+def import_records(stream) -> dict:
+    """Validate then add everything in a record stream (see records()) with one write."""
+    goals, links, keys = plan(stream, dal.goal_graph().ids())
+    try:
+        ids = dal.add_goals(goals, links)
+    except ValueError as e:  # a CycleError, or a goal deleted since plan() ran
+        raise BulkImportError([str(e)]) from e
+    return dict(goals=len(ids), links=len(links), ids={k: ids[i] for k, i in keys.items()})
+
+
+def import_file(text, fmt: str) -> dict:
+    return import_records(records(text, fmt))
+
+
+# ----- WRITING -----
+
+def _iso(v) -> str | None:
+    return None if pd.isna(v) else v.date().isoformat()
+
+
+def _blank(v):
+    return None if v is None or (not isinstance(v, str) and pd.isna(v)) else v
+
+
+def _rows():
+    """Every goal then every link as COLUMNS-keyed dicts, from one snapshot of the data."""
+    gs, rels = dal.read_goals(), dal.read_relationships()
+    gs = gs[gs['id'].notna()]
+    for r in gs.itertuples(index=False):
+        yield dict(type='goal', id=int(r.id), name=_blank(r.name), start_date=_iso(r.start_date),
+                   due_date=_iso(r.due_date), description=_blank(r.description),
+                   display=None if pd.isna(r.display) else int(r.display), tags=_blank(r.tags))
+    rels = rels.dropna(subset=['parent_id', 'child_id'])
+    for p, c in zip(rels['parent_id'].astype(int).tolist(), rels['child_id'].astype(int).tolist()):
+        yield dict(type='link', parent_id=p, child_id=c)
+
+
+def export(fmt: str = 'csv'):
+    """The roadmap as CSV or JSONL text, yielded in chunks of EXPORT_BATCH records."""
+    buf = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.DictWriter(buf, COLUMNS, lineterminator='\n')
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            buf.write(json.dumps({k: v for k, v in row.items() if v is not None}, ensure_ascii=False) + '\n')
+    for n, row in enumerate(_rows(), 1):
+        write(row)
+        if n % EXPORT_BATCH == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+if __name__ == '__main__':
+    import argparse
+    ap = argparse.ArgumentParser(description='Import or export roadmap goals and links as CSV/JSONL.')
+    ap.add_argument('command', choices=['import', 'export'])
+    ap.add_argument('path', nargs='?', default='-', help='file to read or write (default: stdin/stdout)')
+    ap.add_argument('--format', choices=FORMATS, help='default: from the file extension, else csv')
+    args = ap.parse_args()
+    fmt = args.format or format_for(args.path)
+    dal.ensure_workbook()
+    if args.command == 'import':
+        f = sys.stdin if args.path == '-' else open(args.path, newline='', encoding='utf-8-sig')
+        try:
+            print(json.dumps({k: v for k, v in import_file(f, fmt).items() if k != 'ids'}))
+        except BulkImportError as e:
+            sys.exit('\n'.join(e.errors))
+        finally:
+            f.close()
+    else:
+        f = sys.stdout if args.path == '-' else open(args.path, 'w', newline='', encoding='utf-8')
+        with f:
+            for chunk in export(fmt):
+                f.write(chunk)
@@ -1,23 +1,109 @@
 # changelog_dal.py
-import pandas as pd
+"""Append-only changelog stored as CSV.
+
+Entries are appended in place (never rewritten) and the newest ones are read
+back from the end of the file, so neither operation grows with history.
+Each record is written on a single line; the tail reader relies on that.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import os
 from pathlib import Path
 
-CHANGELOG_PATH = Path("changelog.csv")
+import pandas as pd
+
+try:  # POSIX only; on Windows appends are simply unlocked
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+CHANGELOG_PATH = Path(os.environ.get("KOKO_ROADMAP_CHANGELOG", "changelog.csv"))
+CHANGELOG_FSYNC = os.environ.get("KOKO_ROADMAP_CHANGELOG_FSYNC", "0") == "1"
+COLUMNS = ["timestamp", "action", "entity_type", "entity_id", "details"]
+
+_BLOCK = 64 * 1024
+
 
 def read_changelog():
     if not CHANGELOG_PATH.exists():
-        return pd.DataFrame(columns=["timestamp","action","entity_type","entity_id","details"])
+        return pd.DataFrame(columns=COLUMNS)
     df = pd.read_csv(CHANGELOG_PATH)
     return df.fillna("")
 
+
+def _one_line(value) -> str:
+    return " ".join(str(value).splitlines()) if value is not None else ""
+
+
 def append_changelog(action, entity_type, entity_id, details=""):
-    df = read_changelog()
-    new_row = {
-        "timestamp": pd.Timestamp.now().isoformat(timespec="seconds"),
-        "action": action,
-        "entity_type": entity_type,
-        "entity_id": entity_id,
-        "details": details
-    }
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    df.to_csv(CHANGELOG_PATH, index=False)
+    """Append one entry. Safe to call from several processes at once."""
+    row = [pd.Timestamp.now().isoformat(timespec="seconds"),
+           action, entity_type, entity_id, details]
+    buf = io.StringIO()
+    csv.writer(buf, lineterminator="\n").writerow([_one_line(v) for v in row])
+    with open(CHANGELOG_PATH, "a", newline="", encoding="utf-8") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            # Sized after taking the lock: tell() on an 'a' handle is the size at open,
+            # so two writers racing on a new file would both add the header
+            if os.fstat(f.fileno()).st_size == 0:
+                f.write(",".join(COLUMNS) + "\n")
+            f.write(buf.getvalue())
+            f.flush()
+            if CHANGELOG_FSYNC:
+                os.fsync(f.fileno())
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _header(f) -> list[str]:
+    f.seek(0)
+    line = f.readline().decode("utf-8-sig")
+    return next(csv.reader([line]), [])
+
+
+def _tail_lines(f, count: int) -> list[bytes]:
+    """Return up to ``count`` non-empty lines from the end of ``f``, newest first."""
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    lines: list[bytes] = []
+    rest = b""
+    while pos > 0 and len(lines) < count:
+        step = min(_BLOCK, pos)
+        pos -= step
+        f.seek(pos)
+        chunk = f.read(step) + rest
+        parts = chunk.split(b"\n")
+        # the first part may be cut mid-line unless we reached the file start
+        rest = parts.pop(0) if pos > 0 else b""
+        lines.extend(p.rstrip(b"\r") for p in reversed(parts) if p.strip())
+    return lines[:count]
+
+
+def tail_changelog(limit: int = 50, offset: int = 0) -> tuple[list[dict], bool]:
+    """Newest-first page of entries, plus whether older entries exist.
+
+    Only the end of the file is read: roughly ``offset + limit`` lines.
+    """
+    if not CHANGELOG_PATH.exists():
+        return [], False
+    with open(CHANGELOG_PATH, "rb") as f:
+        cols = _header(f)
+        if not cols:
+            return [], False
+        header_at = f.tell()
+        f.seek(0, os.SEEK_END)
+        lines = _tail_lines(f, offset + limit + 1) if f.tell() > header_at else []
+    # the header is the oldest line in the file; drop it if the tail reached it
+    if lines and next(csv.reader([lines[-1].decode("utf-8-sig")]), []) == cols:
+        lines.pop()
+    page = lines[offset:offset + limit]
+    rows = []
+    for values in csv.reader(line.decode("utf-8", "replace") for line in page):
+        values += [""] * (len(cols) - len(values))
+        rows.append(dict(zip(cols, values)))
+    return rows, len(lines) > offset + limit
@@ -0,0 +1,198 @@
+"""Live updates: a Server-Sent Events stream of compact per-edit deltas (/events).
+
+Every edit made through the data layer (excel_dal.on_change) becomes one small
+JSON delta appended to <workbook>.events, so viewers connected to any worker
+see edits made by every worker; stream() tails that file. Deltas:
+
+    {"op": "goal", "id": 7, "goal": {"name": ..., "due": ...}, "new": true}   # only the fields that were set
+    {"op": "goal_deleted", "id": 7}
+    {"op": "link", "parent": 1, "child": 7, "on": true}
+    {"op": "links", "goal": 1, "side": "children", "ids": [2, 3]}             # the full new set
+    {"op": "version"}                                                         # same data, new version token
+    {"op": "reset"}                                                           # refetch everything
+
+Each also carries "prev" and "version", the data versions either side of the
+edit. A page whose version is not `prev` has missed something and refetches
+instead of patching.
+"""
+from __future__ import annotations
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are still atomic enough for one worker
+    fcntl = None
+
+import excel_dal as dal
+
+ENABLED = os.environ.get('KOKO_ROADMAP_EVENTS', '1') == '1'
+MAX_BYTES = 256 * 1024   # the log is cut back to its newer half beyond this
+POLL_SECONDS = 0.5
+HEARTBEAT_SECONDS = 15
+# Streams end after this and EventSource reconnects and resumes, so an open page
+# holds a worker thread for at most this long at a time (see DEPLOYMENT.md)
+STREAM_SECONDS = 25
+RETRY_MS = 1000          # how soon EventSource reconnects after a stream ends
+# Open streams per worker process; beyond this /events turns clients away until
+# a slot frees up, so streams never take every thread from ordinary requests
+MAX_STREAMS = int(os.environ.get('KOKO_ROADMAP_EVENTS_MAX_STREAMS', '8'))
+BUSY_RETRY_MS = 10000    # how soon a turned-away client tries again
+
+_write_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(max(MAX_STREAMS, 1))
+
+
+def events_path() -> str:
+    return dal.EXCEL_PATH + '.events'
+
+
+def _iso(value) -> str:
+    d = dal._to_date(value)
+    return '' if pd.isna(d) else d.date().isoformat()
+
+
+def _goal_fields(args: dict, new: bool) -> dict:
+    fields = {'name': args['name'] or '', 'due': _iso(args['due_date']), 'description': args['description'] or ''}
+    if args.get('start_date') is not None or new:
+        fields['start'] = _iso(args.get('start_date'))
+    if args.get('display') is not None or new:
+        fields['display'] = 1 if args.get('display') is None else int(args['display'])
+    if args.get('tags') is not None or new:
+        fields['tags'] = args.get('tags') or ''
+    return fields
+
+
+def delta(op: str, args: dict) -> dict:
+    """The compact client-side form of one data-layer op."""
+    if op in ('add_goal', 'update_goal'):
+        d = {'op': 'goal', 'id': args['goal_id'], 'goal': _goal_fields(args, op == 'add_goal')}
+        if op == 'add_goal':
+            d['new'] = True
+        return d
+    if op == 'delete_goal':
+        return {'op': 'goal_deleted', 'id': args['goal_id']}
+    if op == 'link':
+        return {'op': 'link', 'parent': args['parent_id'], 'child': args['child_id'], 'on': args['enabled']}
+    if op == 'set_links':
+        side = 'children' if args['own_col'] == 'parent_id' else 'parents'
+        return {'op': 'links', 'goal': args['goal_id'], 'side': side, 'ids': list(args['ids'])}
+    if op == 'flush':
+        return {'op': 'version'}
+    return {'op': 'reset'}
+
+
+@dal.on_change
+def _publish(op: str, args: dict, before: str, after: str):
+    if not ENABLED:
+        return
+    line = json.dumps({**delta(op, args), 'prev': before, 'version': after}, separators=(',', ':')) + '\n'
+    path = events_path()
+    with _write_lock:
+        while True:
+            with open(path, 'a', encoding='utf-8') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    if os.fstat(f.fileno()).st_ino != os.stat(path).st_ino:
+                        continue  # another worker just rotated the log; append to the new one
+                except FileNotFoundError:
+                    continue
+                f.write(line)
+                f.flush()
+                if f.tell() > MAX_BYTES:
+                    _rotate(path)
+                return
+
+
+def _rotate(path: str):
+    # Called with the log locked: keep the newer half, swapped in atomically
+    with open(path, 'rb') as f:
+        data = f.read()
+    keep = data[len(data) // 2:]
+    keep = keep[keep.find(b'\n') + 1:]
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(keep)
+    os.replace(tmp, path)
+
+
+# ----- STREAM -----
+
+def _read_from(path: str, pos: int) -> tuple[int, int, list[str]]:
+    """(inode, new position, complete lines) reading path from byte `pos`."""
+    with open(path, 'rb') as f:
+        ino = os.fstat(f.fileno()).st_ino
+        f.seek(pos)
+        data = f.read()
+    end = data.rfind(b'\n') + 1   # a line still being written is picked up next time
+    return ino, pos + end, data[:end].decode('utf-8').splitlines()
+
+
+def _after(lines: list[str], last: str) -> list[str]:
+    """The lines following the event that produced version `last`, or a reset if it is not in the log."""
+    events = [json.loads(line) for line in lines]
+    for i in range(len(events) - 1, -1, -1):
+        if events[i]['version'] == last:
+            return lines[i + 1:]
+    for i, e in enumerate(events):
+        if e['prev'] == last:
+            return lines[i:]
+    if last == dal.data_version():
+        return []
+    return [json.dumps({'op': 'reset', 'prev': last, 'version': dal.data_version()}, separators=(',', ':'))]
+
+
+def _message(line: str) -> str:
+    return f'id: {json.loads(line)["version"]}\ndata: {line}\n\n'
+
+
+def stream(since: str | None = None):
+    """SSE text for every edit after data version `since` (default: from now on), as it happens.
+
+    With MAX_STREAMS already open in this worker it only tells the client to
+    come back later: an EventSource reconnects after `retry:`, whereas a
+    204/503 would end it for good.
+    """
+    if since is None:
+        since = dal.data_version()
+    if MAX_STREAMS <= 0 or not _slots.acquire(blocking=False):
+        yield f'retry: {BUSY_RETRY_MS}\n\n'
+        return
+    try:
+        yield from _tail(since)
+    finally:
+        _slots.release()
+
+
+def _tail(since: str):
+    path = events_path()
+    yield f'retry: {RETRY_MS}\n\n'
+    ino = pos = None
+    start = beat = time.monotonic()
+    while time.monotonic() - start < STREAM_SECONDS:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            st = None
+        lines = []
+        if st is not None:
+            if st.st_ino != ino:
+                # First look at the log, or it was rotated: pick up after `since`
+                ino, pos, lines = _read_from(path, 0)
+                lines = _after(lines, since)
+            elif st.st_size > pos:
+                ino, pos, lines = _read_from(path, pos)
+        if lines:
+            for line in lines:
+                yield _message(line)
+            since = json.loads(lines[-1])['version']
+            beat = time.monotonic()
+        elif time.monotonic() - beat > HEARTBEAT_SECONDS:
+            yield ': ping\n\n'
+            beat = time.monotonic()
+        time.sleep(POLL_SECONDS)
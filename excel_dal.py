@@ -1,173 +1,810 @@
 from __future__ import annotations
+import atexit
+import contextlib
+import functools
+import json
+import logging
 import os
+import shutil
+import threading
+import time
 from pathlib import Path
+import numpy as np
 import pandas as pd
 
+from goal_graph import GoalGraph, CycleError  # noqa: F401
+from instrumentation import timed
+import snapshot
+
 EXCEL_PATH = os.environ.get('KOKO_ROADMAP_XLSX', 'roadmap.xlsx')
+# 'xlsx' keeps the workbook as the live store; 'sqlite' serves from DB_PATH (see sqlite_dal.py)
+BACKEND = os.environ.get('KOKO_ROADMAP_BACKEND', 'xlsx').strip().lower()
+# Journal edits and save the workbook in the background (xlsx backend; see WRITE-BEHIND below)
+WRITE_BEHIND = os.environ.get('KOKO_ROADMAP_WRITE_BEHIND', '0') == '1'
+# Share parsed sheets between workers as memory-mapped column files (see SHARED SNAPSHOT below)
+SNAPSHOT = os.environ.get('KOKO_ROADMAP_SNAPSHOT', '1') == '1'
+
+try:  # POSIX; elsewhere writers are only serialised within this process
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
 
 class WriteLockedError(Exception):
     pass
 
+LOCKED_MESSAGE = "roadmap.xlsx is locked by another application. Close it and try again."
+
+# ----- SNAPSHOT CACHE -----
+# Parsed, normalised frames per sheet, keyed on the workbook's (mtime, size, inode).
+# Another process saving the file changes the key; our own writes drop the cache.
+
+_cache: dict[str, tuple] = {}
+_cache_stats = {'hits': 0, 'misses': 0}
+_cache_lock = threading.Lock()
+
+def _workbook_key() -> tuple | None:
+    try:
+        st = os.stat(EXCEL_PATH)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+def _data_key() -> tuple | None:
+    key = _workbook_key()
+    if WRITE_BEHIND and key is not None:
+        key += _journal_key()
+    return key
+
+def data_version() -> str:
+    """Opaque token that changes whenever the workbook on disk (or its pending journal) changes."""
+    key = _data_key()
+    if key is None:
+        return '0'
+    return '-'.join(format(k, 'x') for k in key)
+
+def cache_stats() -> dict:
+    with _cache_lock:
+        stats = dict(_cache_stats, sheets=sorted(_cache))
+    if WRITE_BEHIND:
+        stats['journal'] = len(_journal_entries())
+    return stats
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def _cached(sheet: str, loader, key_fn=None) -> pd.DataFrame:
+    key = (key_fn or _workbook_key)()
+    with _cache_lock:
+        hit = _cache.get(sheet)
+        if key is not None and hit is not None and hit[0] == key:
+            _cache_stats['hits'] += 1
+            return hit[1]
+        _cache_stats['misses'] += 1
+    df = loader()
+    if key is not None:
+        with _cache_lock:
+            _cache[sheet] = (key, df)
+    # Shared with every other caller (and memory-mapped from the snapshot): treat as
+    # read-only. Anything that changes a frame in place copies it first.
+    return df
+
+# ----- WRITE PIPELINE -----
+# Each mutation is a read-modify-write run under an exclusive lock on
+# <workbook>.lock, so gunicorn workers never interleave (no lost updates,
+# no duplicate ids from add_goal). Saves go to a temp file that atomically
+# replaces the workbook: readers see the old file or the new one, never half.
+
+LOCK_TIMEOUT = float(os.environ.get('KOKO_ROADMAP_LOCK_TIMEOUT', '10'))
+_RETRY_DELAYS = (0.05, 0.1, 0.2, 0.4, 0.8, 1.6)
+
+_tx_local = threading.local()
+_tx_thread_lock = threading.Lock()
+
+def _acquire(lock_file, deadline: float):
+    delay = 0.005
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            if time.monotonic() >= deadline:
+                raise WriteLockedError("The roadmap is busy with another update. Try again.") from None
+            time.sleep(delay)
+            delay = min(delay * 2, 0.2)
+
+@contextlib.contextmanager
+def transaction():
+    """Hold the workbook write lock for the block. Re-entrant within a thread."""
+    if getattr(_tx_local, 'depth', 0):
+        _tx_local.depth += 1
+        try:
+            yield
+        finally:
+            _tx_local.depth -= 1
+        return
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    if not _tx_thread_lock.acquire(timeout=LOCK_TIMEOUT):
+        raise WriteLockedError("The roadmap is busy with another update. Try again.")
+    try:
+        with contextlib.ExitStack() as stack:
+            if fcntl is not None:
+                lock_file = stack.enter_context(open(EXCEL_PATH + '.lock', 'a'))
+                with timed('lock_wait'):
+                    _acquire(lock_file, deadline)
+            _tx_local.depth = 1
+            try:
+                yield
+            finally:
+                _tx_local.depth = 0
+    finally:
+        _tx_thread_lock.release()
+
+def _locked(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with transaction():
+            return fn(*args, **kwargs)
+    return wrapper
+
+def _retrying(op):
+    """Run op(), backing off while the file is held open elsewhere (e.g. by Excel on Windows)."""
+    for delay in _RETRY_DELAYS:
+        try:
+            return op()
+        except PermissionError:
+            time.sleep(delay)
+    try:
+        return op()
+    except PermissionError as e:
+        raise WriteLockedError(LOCKED_MESSAGE) from e
+
+def _replace_atomic(build):
+    """build(tmp_path) writes the new workbook, which then replaces EXCEL_PATH in one rename."""
+    p = Path(EXCEL_PATH)
+    tmp = p.with_name(f'{p.stem}.{os.getpid()}.tmp.xlsx')
+    try:
+        build(tmp)
+        with open(tmp, 'rb') as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, p)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+# ----- SERIALIZER -----
+# The app owns the workbook's known sheets, so a save rewrites all of them from
+# frames in one streaming pass (openpyxl write_only) rather than loading the
+# whole workbook to replace one sheet. Workbooks carrying other sheets fall
+# back to pandas' load-and-replace so those sheets are preserved.
+
+KNOWN_SHEETS = ('goals', 'relationships', 'changelog')
+
+_sheet_names_memo: dict[str, tuple] = {}
+
+def _sheet_names() -> list[str]:
+    key = _workbook_key()
+    if key is None:
+        return []
+    hit = _sheet_names_memo.get(EXCEL_PATH)
+    if hit is None or hit[0] != key:
+        import openpyxl
+        wb = _retrying(lambda: openpyxl.load_workbook(EXCEL_PATH, read_only=True))
+        hit = _sheet_names_memo[EXCEL_PATH] = (key, list(wb.sheetnames))
+        wb.close()
+    return hit[1]
+
+def _clean_for_excel(df: pd.DataFrame) -> pd.DataFrame:
+    """NaN/NaT/None and the text 'nan' become None (an empty cell); vectorized per column.
+
+    Date-only datetime columns go out as 'YYYY-MM-DD' text, the form the app has always stored.
+    """
+    blank = df.isna()
+    for c in df.columns:
+        if df[c].dtype == object:
+            try:
+                blank[c] |= df[c].str.lower().eq('nan').fillna(False).astype(bool)
+            except AttributeError:  # no strings in this column
+                pass
+    out = df.astype(object).where(~blank, None)
+    for c in df.columns:
+        d = df[c]
+        if pd.api.types.is_datetime64_any_dtype(d) and (d.dropna() == d.dropna().dt.normalize()).all():
+            out[c] = d.dt.strftime('%Y-%m-%d').where(d.notna(), None)
+    return out
+
 def _safe_to_excel(writer, sheet_name: str, df: pd.DataFrame):
     """Write without NaN/NaT strings; keep blanks empty."""
-    df2 = df.copy()
-    for c in df2.columns:
-        df2[c] = df2[c].apply(lambda v: None if (pd.isna(v) or str(v).lower() == 'nan') else v)
-    df2.to_excel(writer, sheet_name=sheet_name, index=False)
+    _clean_for_excel(df).to_excel(writer, sheet_name=sheet_name, index=False)
+
+def _write_workbook(path, sheets: dict[str, pd.DataFrame]):
+    """Stream sheets into a new workbook, with the same header styling as DataFrame.to_excel."""
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, Side
+    thin = Side(style='thin')
+    style = dict(font=Font(bold=True), border=Border(left=thin, right=thin, top=thin, bottom=thin),
+                 alignment=Alignment(horizontal='center', vertical='top'))
+    wb = Workbook(write_only=True)
+    for name, df in sheets.items():
+        ws = wb.create_sheet(name)
+        header = []
+        for col in df.columns:
+            cell = WriteOnlyCell(ws, value=str(col))
+            cell.font, cell.border, cell.alignment = style['font'], style['border'], style['alignment']
+            header.append(cell)
+        ws.append(header)
+        for row in _clean_for_excel(df).itertuples(index=False, name=None):
+            ws.append(row)
+    wb.save(path)
+
+@timed('xlsx_write')
+def _save_sheets(frames: dict[str, pd.DataFrame]):
+    """Atomically save frames (keyed by lower-case sheet name); other sheets keep their saved content."""
+    names = _sheet_names()
+    existing = {n.lower(): n for n in names}
+    if not set(existing) <= set(KNOWN_SHEETS):
+        _replace_atomic(lambda tmp: _append_sheets(tmp, frames))
+        return
+    sheets = {}
+    for key in dict.fromkeys([*existing, *frames]):
+        sheets[existing.get(key, key)] = frames[key] if key in frames else _cached(key, _LOADERS[key])
+    _replace_atomic(lambda tmp: _write_workbook(tmp, sheets))
+    key = _workbook_key()
+    _sheet_names_memo[EXCEL_PATH] = (key, list(sheets))
+    if SNAPSHOT:
+        _publish_snapshot(key, {n.lower(): _as_read_back(n.lower(), df) for n, df in sheets.items()}, list(sheets))
+
+def _append_sheets(tmp, frames: dict[str, pd.DataFrame]):
+    shutil.copyfile(EXCEL_PATH, tmp)
+    with pd.ExcelWriter(tmp, engine='openpyxl', mode='a', if_sheet_exists='replace') as w:
+        for name, df in frames.items():
+            _safe_to_excel(w, name, df)
 
 def ensure_workbook():
-    p = Path(EXCEL_PATH)
-    if not p.exists():
-        with pd.ExcelWriter(EXCEL_PATH, engine='openpyxl') as w:
-            _safe_to_excel(w, 'goals', pd.DataFrame(columns=['id','name','due_date','description','display','tags']))
-            _safe_to_excel(w, 'relationships', pd.DataFrame(columns=['parent_id','child_id']))
-            _safe_to_excel(w, 'changelog', pd.DataFrame(columns=['date','version','note','author']))
+    if WRITE_BEHIND and _flusher_pid != os.getpid() and _journal_key()[0]:
+        # Edits left over from a previous run: get them saved
+        _start_flusher()
+        _flush_event.set()
+    if Path(EXCEL_PATH).exists():
+        return
+    with transaction():
+        if not Path(EXCEL_PATH).exists():
+            _retrying(lambda: _save_sheets({
+                'goals': pd.DataFrame(columns=['id','name','due_date','description','display','tags']),
+                'relationships': pd.DataFrame(columns=['parent_id','child_id']),
+                'changelog': pd.DataFrame(columns=['date','version','note','author']),
+            }))
+
+# ----- LOADER -----
+# One read_only pass over the workbook yields every sheet, keyed by lower-case
+# name. Columns are built straight into the dtypes declared in SCHEMA.
+
+SCHEMA = {
+    'goals': {'id': 'int', 'name': 'text', 'start_date': 'date', 'due_date': 'date',
+              'description': 'text', 'display': 'int', 'tags': 'text'},
+    'relationships': {'parent_id': 'int', 'child_id': 'int'},
+    'changelog': {'date': 'any', 'version': 'any', 'note': 'any', 'author': 'any'},
+}
+
+def _as_ints(s: pd.Series) -> pd.Series:
+    # Nullable Int64: blanks and junk become <NA> (display <NA> means "not set", i.e. shown)
+    return np.trunc(pd.to_numeric(s, errors='coerce').astype(float)).astype('Int64')
+
+def _as_dates(s: pd.Series) -> pd.Series:
+    d = pd.to_datetime(s, errors='coerce', format='ISO8601')
+    # Non-ISO text (e.g. 31/12/2035) falls back to per-value parsing
+    text = s.map(lambda v: isinstance(v, str) and v.strip() != '')
+    retry = d.isna() & text
+    if retry.any():
+        d[retry] = pd.to_datetime(s[retry], errors='coerce', format='mixed')
+    return d
+
+def _as_text(s: pd.Series) -> pd.Series:
+    other = s.notna() & ~s.map(lambda v: isinstance(v, str))
+    if other.any():
+        s[other] = s[other].astype(str)
+    return s
+
+_CONVERTERS = {'int': _as_ints, 'date': _as_dates, 'text': _as_text, 'any': lambda s: s}
+
+def _typed_frame(sheet: str, columns: dict[str, list]) -> pd.DataFrame:
+    """DataFrame from raw column values, with SCHEMA[sheet] dtypes and any missing schema columns added."""
+    n = len(next(iter(columns.values()), ()))
+    schema = SCHEMA.get(sheet, {})
+    data = {}
+    for name, values in columns.items():
+        kind = schema.get(name, 'any')
+        data[name] = _CONVERTERS[kind](pd.Series(values, dtype=object))
+    for name, kind in schema.items():
+        if name not in data:
+            data[name] = _CONVERTERS[kind](pd.Series([None] * n, dtype=object))
+    return pd.DataFrame(data, index=pd.RangeIndex(n))
+
+def _typed(sheet: str, df: pd.DataFrame) -> pd.DataFrame:
+    """Apply SCHEMA[sheet] to a frame from elsewhere (e.g. the SQLite backend)."""
+    return _typed_frame(sheet, {str(c).lower(): df[c].tolist() for c in df.columns})
 
-def _read_sheet(name: str) -> pd.DataFrame:
+@timed('xlsx_read')
+def _read_workbook(path: str | None = None) -> dict[str, pd.DataFrame]:
+    """Every sheet of the workbook, typed, keyed by lower-case sheet name (first match wins)."""
+    import openpyxl
+    path = path or EXCEL_PATH
+    wb = _retrying(lambda: openpyxl.load_workbook(path, read_only=True, data_only=True))
+    try:
+        frames = {}
+        for ws in wb.worksheets:
+            key = ws.title.lower()
+            if key in frames:
+                continue
+            rows = ws.iter_rows(values_only=True)
+            header = list(next(rows, ()))
+            while header and header[-1] is None:
+                header.pop()
+            width = len(header)
+            body = [r[:width] + (None,) * (width - len(r)) for r in rows
+                    if any(v is not None for v in r[:width])]
+            names = [str(h).lower() if h is not None else f'unnamed: {i}' for i, h in enumerate(header)]
+            values = zip(*body) if body else ([] for _ in names)
+            frames[key] = _typed_frame(key, dict(zip(names, (list(v) for v in values))))
+        if path == EXCEL_PATH:
+            _sheet_names_memo[EXCEL_PATH] = (_workbook_key(), list(wb.sheetnames))
+    finally:
+        wb.close()
+    return frames
+
+def _load_all(sheet: str) -> pd.DataFrame:
+    # Parse once (or map the shared snapshot), then hand the sibling sheets to the cache as well
     ensure_workbook()
+    key = _workbook_key()
+    frames = _read_snapshot(key)
+    if frames is None:
+        frames = _read_workbook()
+        if SNAPSHOT and key is not None and _workbook_key() == key:
+            # Save the other workers this parse
+            _publish_snapshot(key, {n: frames[n] for n in SCHEMA if n in frames}, _sheet_names_memo[EXCEL_PATH][1])
+    for name in SCHEMA:
+        if name not in frames:
+            frames[name] = _typed_frame(name, {})
+    with _cache_lock:
+        for name in SCHEMA:
+            if name != sheet:
+                _cache[name] = (key, frames[name])
+    return frames[sheet]
+
+# ----- SHARED SNAPSHOT -----
+# Every save also writes the typed sheets as column files under
+# <workbook>.snapshot/<version>/ (see snapshot.py). Workers map those instead
+# of each parsing the workbook after an edit, and share the numeric and date
+# columns' memory. A workbook saved by anything else (Excel, another tool) has
+# no snapshot for its version: the first worker to read it parses it and
+# publishes one for the rest.
+
+def _snapshot_dir() -> str:
+    return EXCEL_PATH + '.snapshot'
+
+def _as_read_back(sheet: str, df: pd.DataFrame) -> pd.DataFrame:
+    """df as _read_workbook() will load it once saved: cleaned cells, blank rows dropped, SCHEMA dtypes."""
+    cells = _clean_for_excel(df)
+    cells = cells.where(cells.ne(''), None)  # an empty string is saved as an empty cell
+    cells = cells[cells.notna().any(axis=1)]
+    return _typed_frame(sheet, {str(c).lower(): cells[c].tolist() for c in cells.columns})
+
+@timed('snapshot_write')
+def _publish_snapshot(key: tuple, frames: dict[str, pd.DataFrame], sheetnames: list[str]):
     try:
-        df = pd.read_excel(EXCEL_PATH, sheet_name=name, engine='openpyxl')
-    except PermissionError as e:
-        raise WriteLockedError("roadmap.xlsx is locked by another application. Close it and try again.") from e
-    except ValueError:
-        # Try case-insensitive match first
-        try:
-            import openpyxl
-            wb = openpyxl.load_workbook(EXCEL_PATH, read_only=True)
-            sheet_names = wb.sheetnames
-            wb.close()
-            # Find case-insensitive match
-            matched_name = None
-            for sheet_name in sheet_names:
-                if sheet_name.lower() == name.lower():
-                    matched_name = sheet_name
-                    break
-            if matched_name:
-                df = pd.read_excel(EXCEL_PATH, sheet_name=matched_name, engine='openpyxl')
-            else:
-                # Create empty sheet if not found
-                with pd.ExcelWriter(EXCEL_PATH, engine='openpyxl', mode='a', if_sheet_exists='overlay') as w:
-                    _safe_to_excel(w, name, pd.DataFrame())
-                df = pd.read_excel(EXCEL_PATH, sheet_name=name, engine='openpyxl')
-        except Exception:
-            # Fallback: create empty sheet
-            with pd.ExcelWriter(EXCEL_PATH, engine='openpyxl', mode='a', if_sheet_exists='overlay') as w:
-                _safe_to_excel(w, name, pd.DataFrame())
-            df = pd.read_excel(EXCEL_PATH, sheet_name=name, engine='openpyxl')
-    return df
+        snapshot.write(_snapshot_dir(), key, frames, SCHEMA, sheetnames)
+    except OSError:
+        logging.getLogger(__name__).exception('Could not write the workbook snapshot; workers will parse the workbook')
+
+@timed('snapshot_read')
+def _read_snapshot(key: tuple | None) -> dict[str, pd.DataFrame] | None:
+    if not SNAPSHOT or key is None:
+        return None
+    try:
+        hit = snapshot.read(_snapshot_dir(), key)
+    except (OSError, ValueError, KeyError):
+        logging.getLogger(__name__).exception('Unreadable workbook snapshot; parsing the workbook instead')
+        return None
+    if hit is None:
+        return None
+    frames, sheetnames = hit
+    _sheet_names_memo[EXCEL_PATH] = (key, sheetnames)
+    return frames
 
 def _write_sheet(name: str, df: pd.DataFrame):
     try:
-        with pd.ExcelWriter(EXCEL_PATH, engine='openpyxl', mode='a', if_sheet_exists='replace') as w:
-            _safe_to_excel(w, name, df)
-    except PermissionError as e:
-        raise WriteLockedError("roadmap.xlsx is locked by another application. Close it and try again.") from e
+        with transaction():
+            _retrying(lambda: _save_sheets({name: df}))
+    finally:
+        clear_cache()
+
+_memos: list[dict] = []
+
+def clear_memos():
+    """Drop every per_version memo, e.g. to time building them from scratch."""
+    with _cache_lock:
+        for memo in _memos:
+            memo.clear()
+
+def per_version(fn):
+    """Memoise fn(*args) until data_version() changes; for structures derived from the sheets."""
+    memo: dict[tuple, tuple] = {}
+    _memos.append(memo)
+    @functools.wraps(fn)
+    def wrapper(*args):
+        v = data_version()
+        hit = memo.get(args)
+        if hit is not None and hit[0] == v:
+            return hit[1]
+        value = fn(*args)
+        with _cache_lock:
+            if len(memo) >= 64:
+                memo.clear()
+            memo[args] = (v, value)
+        return value
+    wrapper.cache_clear = memo.clear
+    return wrapper
 
 # ----- READERS -----
+# The frames returned are the cached ones, shared by every caller: treat as read-only.
 
 def read_changelog() -> pd.DataFrame:
-    df = _read_sheet('changelog')
-    # normalise expected columns
-    for c in ['date','version','note','author']:
-        if c not in df.columns: df[c] = None
-    return df
+    return _read_xlsx('changelog')
 
 def read_goals() -> pd.DataFrame:
-    df = _read_sheet('goals')
-    # Normalize column names to lowercase for case-insensitive matching
-    df.columns = df.columns.astype(str).str.lower()
-    for c in ['id','name','start_date','due_date','description','display','tags']:
-        if c not in df.columns: df[c] = None
-    # Convert display column to numeric, preserving 0 values and NaN (which means default Yes)
-    if 'display' in df.columns:
-        # Convert to numeric, coercing errors to NaN
-        df['display'] = pd.to_numeric(df['display'], errors='coerce')
-        # Don't fill NaN - keep it as NaN (means default Yes, but not explicitly set)
-        # Only convert non-NaN values to int
-        mask = df['display'].notna()
-        df.loc[mask, 'display'] = df.loc[mask, 'display'].astype(int)
-    else:
-        df['display'] = pd.NA  # Use pd.NA to indicate not set (defaults to Yes)
-    return df
+    return _read_xlsx('goals')
 
 def read_relationships() -> pd.DataFrame:
-    df = _read_sheet('relationships')
-    # Normalize column names to lowercase
-    df.columns = df.columns.astype(str).str.lower()
-    for c in ['parent_id','child_id']:
-        if c not in df.columns: df[c] = None
-    return df
+    return _read_xlsx('relationships')
+
+_LOADERS = {name: functools.partial(_load_all, name) for name in SCHEMA}
+
+def _read_xlsx(sheet: str) -> pd.DataFrame:
+    if not WRITE_BEHIND:
+        return _cached(sheet, _LOADERS[sheet])
+    # The saved sheet is cached on the workbook key; the overlay also on the journal's
+    return _cached(sheet + '+journal', lambda: _replay(sheet, _cached(sheet, _LOADERS[sheet])), _data_key)
+
+@per_version
+def goal_graph() -> GoalGraph:
+    """Shared adjacency index for the current data version. Treat as read-only."""
+    return GoalGraph.from_frames(read_goals(), read_relationships())
+
+# ----- CHANGE HOOKS -----
+# Indexes that can patch themselves (see search_index.py) subscribe here rather
+# than rebuilding from the sheets after every edit. Listeners run in the process
+# that made the edit, once it is persisted, with the data versions either side
+# of it; edits made by other workers only show up as a changed data_version().
+
+_listeners: list = []
+
+def on_change(fn):
+    """Register fn(op, args, before, after), called after each edit made by this process."""
+    _listeners.append(fn)
+    return fn
+
+def _notify(op: str, args: dict, before: str, after: str):
+    for fn in _listeners:
+        try:
+            fn(op, args, before, after)
+        except Exception:
+            logging.getLogger(__name__).exception('Change listener %r failed', fn)
 
 # ----- UPDATERS -----
+# Each mutator validates against the current state, then hands a logical op to
+# _commit. The _apply_* functions are pure (frame in, frame out) so the same
+# code serves direct saves and write-behind journal replay.
+
+def _to_date(value):
+    if not value:
+        return pd.NaT
+    d = pd.to_datetime(value, errors='coerce')
+    return pd.NaT if pd.isna(d) else pd.Timestamp(d.date())
 
+@_locked
 def update_goal(goal_id: int, name: str, due_date: str, description: str, display: int | None = None, tags: str | None = None, start_date: str | None = None):
-    df = read_goals()
-    idx = df.index[df['id'] == int(goal_id)]
+    _commit('update_goal', goal_id=int(goal_id), name=name, due_date=due_date, description=description,
+            display=None if display is None else int(display), tags=tags, start_date=start_date)
+
+def _apply_update_goal(df, goal_id, name, due_date, description, display=None, tags=None, start_date=None):
+    idx = df.index[df['id'] == goal_id]
     if len(idx) == 0: raise ValueError(f'Goal id {goal_id} not found')
+    df = df.copy()  # df may be the shared cached frame
     df.loc[idx, 'name'] = name
     if start_date is not None:
-        if start_date:
-            d = pd.to_datetime(start_date, errors='coerce')
-            df.loc[idx, 'start_date'] = ('' if pd.isna(d) else d.date().isoformat())
-        else:
-            df.loc[idx, 'start_date'] = ''
-    if due_date:
-        d = pd.to_datetime(due_date, errors='coerce')
-        df.loc[idx, 'due_date'] = ('' if pd.isna(d) else d.date().isoformat())
-    else:
-        df.loc[idx, 'due_date'] = ''
+        df.loc[idx, 'start_date'] = _to_date(start_date)
+    df.loc[idx, 'due_date'] = _to_date(due_date)
     df.loc[idx, 'description'] = description
     if display is not None:
-        df.loc[idx, 'display'] = int(display)
+        df.loc[idx, 'display'] = display
     if tags is not None:
         df.loc[idx, 'tags'] = tags
-    _write_sheet('goals', df)
+    return df
 
 # ----- CREATORS -----
 
+@_locked
 def add_goal(name: str, due_date: str | None, description: str, display: int | None = None, tags: str | None = None, start_date: str | None = None):
     df = read_goals()
     next_id = (int(df['id'].max()) + 1) if not df.empty and df['id'].notna().any() else 1
-    rec = {'id': next_id, 'name': name}
-    if start_date:
-        d = pd.to_datetime(start_date, errors='coerce')
-        rec['start_date'] = ('' if pd.isna(d) else d.date().isoformat())
-    else:
-        rec['start_date'] = ''
-    if due_date:
-        d = pd.to_datetime(due_date, errors='coerce')
-        rec['due_date'] = ('' if pd.isna(d) else d.date().isoformat())
-    else:
-        rec['due_date'] = ''
-    rec['description'] = description
-    rec['display'] = int(display) if display is not None else 1  # Default to visible
-    rec['tags'] = tags if tags is not None else ''
-    df = pd.concat([df, pd.DataFrame([rec])], ignore_index=True)
-    _write_sheet('goals', df)
+    _commit('add_goal', goal_id=next_id, name=name, due_date=due_date, description=description,
+            display=None if display is None else int(display), tags=tags, start_date=start_date)
     return next_id
 
+def _apply_add_goal(df, goal_id, name, due_date, description, display=None, tags=None, start_date=None):
+    rec = {'id': goal_id, 'name': name,
+           'start_date': _to_date(start_date),
+           'due_date': _to_date(due_date),
+           'description': description,
+           'display': display if display is not None else 1,  # Default to visible
+           'tags': tags if tags is not None else ''}
+    # Replaying a journal that was already saved must not duplicate the row
+    df = df[df['id'] != goal_id]
+    return pd.concat([df, pd.DataFrame([rec])], ignore_index=True)
+
+@_locked
+def add_goals(goals: list[dict], links=()) -> list[int]:
+    """Add many goals (dicts of add_goal's arguments) and parent → child links with one workbook save.
+
+    A link end below zero stands for a goal of this batch (-1 is goals[0]); any
+    other end is an existing goal id. Returns the ids given to the new goals.
+    """
+    if WRITE_BEHIND:
+        flush()  # fold pending edits in first, so this save carries them too
+    gs, rels = read_goals(), read_relationships()
+    first = (int(gs['id'].max()) + 1) if not gs.empty and gs['id'].notna().any() else 1
+    ids = range(first, first + len(goals))
+    pairs = _check_bulk_links(goal_graph(), ids, links)
+    if not ids and not pairs:
+        return []
+    new = _typed_frame('goals', {
+        'id': list(ids),
+        'name': [g.get('name') for g in goals],
+        'start_date': [g.get('start_date') or None for g in goals],
+        'due_date': [g.get('due_date') or None for g in goals],
+        'description': [g.get('description') for g in goals],
+        'display': [1 if g.get('display') is None else int(g['display']) for g in goals],
+        'tags': [g.get('tags') or '' for g in goals],
+    })
+    for c in ('start_date', 'due_date'):
+        new[c] = new[c].dt.normalize()
+    frames = {}
+    if ids:
+        frames['goals'] = pd.concat([gs, new[gs.columns]], ignore_index=True)
+    if pairs:
+        frames['relationships'] = pd.concat([rels, pd.DataFrame(pairs, columns=['parent_id', 'child_id'])],
+                                            ignore_index=True)
+    before = data_version()
+    try:
+        _retrying(lambda: _save_sheets(frames))
+    finally:
+        clear_cache()
+    _notify('add_goals', {'goal_ids': list(ids), 'links': len(pairs)}, before, data_version())
+    return list(ids)
+
+def _check_bulk_links(graph: GoalGraph, ids: range, links) -> list[tuple[int, int]]:
+    """links with batch ends resolved to `ids`, minus those already present; ValueError/CycleError if any is invalid."""
+    pairs = []
+    for p, c in dict.fromkeys((int(p), int(c)) for p, c in links):
+        p, c = ids[-p - 1] if p < 0 else p, ids[-c - 1] if c < 0 else c
+        if p == c:
+            raise CycleError(f'Goal {p} cannot be linked to itself')
+        for end in (p, c):
+            if end not in graph and end not in ids:
+                raise ValueError(f'Goal id {end} not found')
+        if not graph.has_edge(p, c):
+            pairs.append((p, c))
+    if pairs:
+        edges = [(p, c) for p, cs in graph.children.items() for c in cs] + pairs
+        cycle = GoalGraph([*graph.ids(), *ids], edges).find_cycle()
+        if cycle:
+            raise CycleError('Links would create a cycle: ' + ' → '.join(map(str, cycle)))
+    return pairs
+
 # ----- DELETERS -----
 
+@_locked
 def delete_goal(goal_id: int):
-    df = read_goals()
-    idx = df.index[df['id'] == int(goal_id)]
+    _commit('delete_goal', goal_id=int(goal_id))
+
+def _apply_delete_goal(df, goal_id):
+    idx = df.index[df['id'] == goal_id]
     if len(idx) == 0:
         raise ValueError(f'Goal id {goal_id} not found')
-    df = df.drop(index=idx)
-    _write_sheet('goals', df)
+    return df.drop(index=idx)
 
 # ----- RELATIONSHIP TOGGLERS -----
 
+@_locked
 def toggle_link_goal(parent_id: int, child_id: int, enabled: bool):
+    g = goal_graph()
+    if g.has_edge(int(parent_id), int(child_id)) == bool(enabled):
+        return
+    if enabled:
+        g.check_link(int(parent_id), int(child_id))
+    _commit('link', parent_id=int(parent_id), child_id=int(child_id), enabled=bool(enabled))
+
+def _apply_link(df, parent_id, child_id, enabled):
+    mask = (df['parent_id'] == parent_id) & (df['child_id'] == child_id)
+    if enabled and not mask.any():
+        return pd.concat([df, pd.DataFrame([{'parent_id': parent_id, 'child_id': child_id}])], ignore_index=True)
+    if not enabled:
+        return df[~mask]
+    return df
+
+@_locked
+def _set_links(own_col: str, other_col: str, goal_id: int, ids) -> bool:
     df = read_relationships()
-    mask = (df['parent_id'] == int(parent_id)) & (df['child_id'] == int(child_id))
-    exists = df[mask]
-    changed = False
-    if enabled and exists.empty:
-        df = pd.concat([df, pd.DataFrame([{'parent_id': int(parent_id), 'child_id': int(child_id)}])], ignore_index=True)
-        changed = True
-    if (not enabled) and not exists.empty:
-        df = df.drop(exists.index)
-        changed = True
-    if changed:
-        _write_sheet('relationships', df)
+    goal_id = int(goal_id)
+    wanted = {int(i) for i in ids}
+    wanted.discard(goal_id)
+    current = set(df.loc[df[own_col] == goal_id, other_col].dropna().astype(int).tolist())
+    if current == wanted:
+        return False
+    _check_new_links(own_col, goal_id, wanted - current)
+    _commit('set_links', own_col=own_col, goal_id=goal_id, ids=sorted(wanted))
+    return True
+
+def _apply_set_links(df, own_col, goal_id, ids):
+    other_col = 'child_id' if own_col == 'parent_id' else 'parent_id'
+    mine = df[own_col] == goal_id
+    current = set(df.loc[mine, other_col].dropna().astype(int).tolist())
+    keep = ~mine | df[other_col].isin(ids)
+    added = [i for i in ids if i not in current]
+    if not added:
+        return df[keep].reset_index(drop=True)
+    new = pd.DataFrame({own_col: [goal_id] * len(added), other_col: added})
+    return pd.concat([df[keep], new], ignore_index=True)[df.columns]
+
+def _check_new_links(own_col: str, goal_id: int, added):
+    # All new links share goal_id as one end, so each can be checked on its own
+    g = goal_graph()
+    for other in added:
+        if own_col == 'parent_id':
+            g.check_link(goal_id, other)
+        else:
+            g.check_link(other, goal_id)
+
+def set_children(parent_id: int, child_ids) -> bool:
+    """Make child_ids exactly the children of parent_id, in a single write. Returns True if anything changed."""
+    return _set_links('parent_id', 'child_id', parent_id, child_ids)
+
+def set_parents(child_id: int, parent_ids) -> bool:
+    """Make parent_ids exactly the parents of child_id, in a single write. Returns True if anything changed."""
+    return _set_links('child_id', 'parent_id', child_id, parent_ids)
+
+# op name -> (sheet, applier)
+_OPS = {
+    'update_goal': ('goals', _apply_update_goal),
+    'add_goal': ('goals', _apply_add_goal),
+    'delete_goal': ('goals', _apply_delete_goal),
+    'link': ('relationships', _apply_link),
+    'set_links': ('relationships', _apply_set_links),
+}
+
+def _commit(op: str, **args):
+    """Apply a logical op to the current state and persist it: a direct save, or a journal append in write-behind mode."""
+    sheet, apply = _OPS[op]
+    before = data_version()
+    df = apply(_read_xlsx(sheet), **args)
+    if WRITE_BEHIND:
+        _journal_append(op, args)
+    else:
+        _write_sheet(sheet, df)
+    _notify(op, args, before, data_version())
+
+# ----- WRITE-BEHIND -----
+# With KOKO_ROADMAP_WRITE_BEHIND=1 mutations are appended (fsynced) to
+# <workbook>.journal instead of saving the workbook. Readers in every worker
+# overlay the journal on the last saved workbook, so edits are visible at
+# once. A background thread folds the journal into the workbook with a single
+# save every KOKO_ROADMAP_FLUSH_INTERVAL seconds and at exit; a journal left
+# by a crash is replayed the same way on the next start. Replay is
+# idempotent, so a crash between save and truncate is harmless.
+
+FLUSH_INTERVAL = float(os.environ.get('KOKO_ROADMAP_FLUSH_INTERVAL', '3'))
+
+_flush_event = threading.Event()
+_flusher_pid = None
+
+def _journal_path() -> str:
+    return EXCEL_PATH + '.journal'
+
+def _journal_key() -> tuple:
+    try:
+        st = os.stat(_journal_path())
+    except FileNotFoundError:
+        return (0,)
+    return (st.st_size, st.st_mtime_ns)
+
+def _journal_entries() -> list[dict]:
+    try:
+        with open(_journal_path(), encoding='utf-8') as f:
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return []
+    entries = []
+    for line in lines:
+        try:
+            entries.append(json.loads(line))
+        except ValueError:
+            # a torn final line from a crash mid-append
+            continue
+    return entries
+
+@timed('journal_append')
+def _journal_append(op: str, args: dict):
+    line = json.dumps({'op': op, 'args': args}, separators=(',', ':')) + '\n'
+    with open(_journal_path(), 'a', encoding='utf-8') as f:
+        f.write(line)
+        f.flush()
+        os.fsync(f.fileno())
+    _start_flusher()
+    _flush_event.set()
+
+def _replay(sheet: str, df: pd.DataFrame, entries=None) -> pd.DataFrame:
+    for e in _journal_entries() if entries is None else entries:
+        op_sheet, apply = _OPS[e['op']]
+        if op_sheet != sheet:
+            continue
+        try:
+            df = apply(df, **e['args'])
+        except ValueError:
+            # e.g. an edit to a goal deleted later on; already reflected in the sheet
+            continue
+    return df
+
+def flush() -> bool:
+    """Fold pending journal entries into the workbook with one save. Returns True if anything was written."""
+    with transaction():
+        entries = _journal_entries()
+        if not entries:
+            return False
+        before = data_version()
+        sheets = sorted({_OPS[e['op']][0] for e in entries})
+        frames = {s: _replay(s, _cached(s, _LOADERS[s]), entries) for s in sheets}
+        try:
+            _retrying(lambda: _save_sheets(frames))
+        finally:
+            clear_cache()
+        os.truncate(_journal_path(), 0)
+        # Same data, new version token
+        _notify('flush', {}, before, data_version())
+        return True
+
+def _flush_loop():
+    while True:
+        _flush_event.wait()
+        time.sleep(FLUSH_INTERVAL)  # let a burst of edits pile up
+        _flush_event.clear()
+        try:
+            flush()
+        except Exception:
+            logging.getLogger(__name__).exception('Write-behind flush failed; will retry')
+            _flush_event.set()
+
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logging.getLogger(__name__).exception('Write-behind flush at exit failed; the journal will be replayed on next start')
+
+def _start_flusher():
+    # Threads do not survive fork, so each (gunicorn) worker starts its own
+    global _flusher_pid
+    if _flusher_pid == os.getpid():
+        return
+    _flusher_pid = os.getpid()
+    threading.Thread(target=_flush_loop, name='roadmap-flusher', daemon=True).start()
+    atexit.register(_flush_at_exit)
+
+# ----- BACKEND SELECTION -----
+# With KOKO_ROADMAP_BACKEND=sqlite the public API above is served by sqlite_dal;
+# the xlsx helpers stay available for import/export.
+if BACKEND == 'sqlite':
+    from sqlite_dal import (  # noqa: E402,F401
+        ensure_workbook, data_version,
+        read_changelog, read_goals, read_relationships,
+        update_goal, add_goal, add_goals, delete_goal,
+        toggle_link_goal, set_children, set_parents,
+    )
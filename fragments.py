@@ -0,0 +1,106 @@
+"""Rendered HTML fragments reused across requests: /goals table rows and link-page checkboxes.
+
+Each fragment is cached under its goal id together with a signature of exactly
+the data it shows. An edit therefore re-renders only the fragments whose goal
+(or linked goals' names) it changed -- in whichever worker serves the page --
+and the rest of the page is assembled from cached markup. Least recently used
+entries go once a cache holds KOKO_ROADMAP_FRAGMENT_CACHE of them (default
+20000 each for rows and checkboxes; 0 turns caching off).
+"""
+from __future__ import annotations
+import os
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+from flask import get_template_attribute
+from markupsafe import Markup
+
+from excel_dal import read_goals, per_version
+from instrumentation import timed
+import view_models as vm
+
+MAX_ENTRIES = int(os.environ.get('KOKO_ROADMAP_FRAGMENT_CACHE', '20000'))
+
+
+class LRUCache:
+    """key -> (signature, markup); a lookup with a different signature renders afresh and replaces the entry."""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key, sig, render) -> Markup:
+        if self.maxsize <= 0:
+            return render()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] == sig:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+            self.misses += 1
+        html = render()
+        with self._lock:
+            self._entries[key] = (sig, html)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return html
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(entries=len(self._entries), hits=self.hits, misses=self.misses)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_rows = LRUCache(MAX_ENTRIES)
+_choices = LRUCache(MAX_ENTRIES)
+
+
+def stats() -> dict:
+    return dict(rows=_rows.stats(), choices=_choices.stats())
+
+
+def clear():
+    _rows.clear()
+    _choices.clear()
+
+
+def _signature(row: dict) -> tuple:
+    return tuple(tuple(v) if isinstance(v, list) else v for v in row.values())
+
+
+@timed('render_fragments')
+def goal_rows(rows: list[dict]) -> list[Markup]:
+    """The <tr> of each /goals table row (templates/_goal_row.html), rendering only rows not seen as they are now."""
+    macro = get_template_attribute('_goal_row.html', 'goal_row')
+    return [_rows.get(r['id'], _signature(r), lambda r=r: Markup(macro(r))) for r in rows]
+
+
+@per_version
+@timed('view_model')
+def _choice_order() -> list[tuple[int, str]]:
+    """(id, name) of every goal, sorted by name, for the link pages' checkbox lists."""
+    gs = vm.valid_goals(read_goals()).sort_values(['name'])
+    return list(zip(gs['id'].astype(int).tolist(), gs['name'].tolist()))
+
+
+@timed('render_fragments')
+def link_choices(field: str, goal_id: int, linked) -> Markup:
+    """Checkboxes named `field` for every goal but goal_id, ticked for those in `linked` (templates/_link_choice.html)."""
+    macro = get_template_attribute('_link_choice.html', 'link_choice')
+    out = []
+    for gid, name in _choice_order():
+        if gid == goal_id:
+            continue
+        checked = gid in linked
+        sig = None if pd.isna(name) else name
+        out.append(_choices.get((field, gid, checked), sig,
+                                lambda gid=gid, name=name, checked=checked: Markup(macro(field, dict(id=gid, name=name), checked))))
+    return Markup('\n').join(out)
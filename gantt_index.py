@@ -0,0 +1,84 @@
+"""Gantt payloads, optionally cut to a date window, built once per data version.
+
+Bars follow gantt.html's rules: a goal spans start..due; with only one of the
+two dates it sits on that date; an end before the start is clamped to the
+start. Goals without any date are drawn on today, so they only fall inside
+windows that contain today.
+"""
+from __future__ import annotations
+import datetime as dt
+
+import numpy as np
+
+from excel_dal import read_goals, read_relationships, per_version
+from instrumentation import timed
+import tag_index
+import view_models as vm
+
+
+class GanttIndex:
+    """Visible goals' bars sorted by start day, for overlap queries."""
+
+    __slots__ = ('goals', 'order', 'starts', 'ends', 'undated')
+
+    def __init__(self, gs):
+        gs = vm.visible_goals(gs).reset_index(drop=True)
+        self.goals = vm.goal_payload(gs, ['id', 'name', 'start', 'due', 'tags'])
+        start, due = gs['start_date'], gs['due_date']
+        s = start.fillna(due)
+        e = due.fillna(start)
+        e = e.where(e >= s, s)
+        dated = s.notna().to_numpy()
+        days_s = s[dated].to_numpy().astype('datetime64[D]')
+        days_e = e[dated].to_numpy().astype('datetime64[D]')
+        by_start = np.argsort(days_s, kind='stable')
+        self.order = np.flatnonzero(dated)[by_start]
+        self.starts = days_s[by_start]
+        self.ends = days_e[by_start]
+        self.undated = np.flatnonzero(~dated)
+
+    def window(self, lo: dt.date | None = None, hi: dt.date | None = None) -> list[int]:
+        """Positions (in self.goals order) of bars overlapping [lo, hi]; either bound may be open."""
+        cut = len(self.starts) if hi is None else int(np.searchsorted(self.starts, np.datetime64(hi, 'D'), side='right'))
+        picked = self.order[:cut]
+        if lo is not None:
+            picked = picked[self.ends[:cut] >= np.datetime64(lo, 'D')]
+        today = dt.date.today()
+        if (lo is None or lo <= today) and (hi is None or today <= hi):
+            picked = np.concatenate([picked, self.undated])
+        return np.sort(picked).tolist()
+
+
+@per_version
+@timed('view_model')
+def index() -> GanttIndex:
+    return GanttIndex(read_goals())
+
+
+@per_version
+@timed('view_model')
+def payload(lo: str = '', hi: str = '', tags: tuple = (), mode: str = 'any') -> dict:
+    """The /gantt data for goals overlapping lo..hi (ISO dates, '' = open) and passing the tag filter."""
+    idx = index()
+    if lo or hi:
+        goals = [idx.goals[i] for i in idx.window(dt.date.fromisoformat(lo) if lo else None,
+                                                  dt.date.fromisoformat(hi) if hi else None)]
+    else:
+        goals = idx.goals
+    tagged = tag_index.goal_ids(tags, mode)
+    if tagged is not None:
+        goals = [g for g in goals if g['id'] in tagged]
+    shown = {g['id'] for g in goals}
+    # Parent-child relationships for grouping, limited to the goals shipped
+    children_by_parent, parent_by_child = vm.hierarchy_maps(read_relationships())
+    if len(goals) < len(idx.goals):
+        children_by_parent = {p: [c for c in cs if c in shown] for p, cs in children_by_parent.items() if p in shown}
+        parent_by_child = {c: p for c, p in parent_by_child.items() if c in shown}
+    return dict(
+        goals=goals,
+        relationships=dict(
+            children_by_parent=children_by_parent,
+            parent_by_child=parent_by_child
+        ),
+        window={'from': lo or None, 'to': hi or None, 'total': len(idx.goals)},
+    )
@@ -0,0 +1,151 @@
+"""In-memory index over goals and parent → child links.
+
+Built once per data version (see excel_dal.goal_graph()) and shared by the
+validators and routes, so membership and adjacency checks are dict/set lookups
+instead of scans over the relationships frame. Descendant/ancestor sets are
+computed on first use and kept for the life of the graph, i.e. until the next
+edit (toggle_link_goal and friends) bumps the data version.
+"""
+from __future__ import annotations
+import pandas as pd
+
+class CycleError(ValueError):
+    pass
+
+class GoalGraph:
+    __slots__ = ('row', 'children', 'parents', '_down', '_up')
+
+    def __init__(self, goal_ids, edges):
+        # id -> positional row in the goals frame the graph was built from
+        self.row: dict[int, int] = {}
+        for i, gid in enumerate(goal_ids):
+            self.row[gid] = i
+        self.children: dict[int, set[int]] = {}
+        self.parents: dict[int, set[int]] = {}
+        for p, c in edges:
+            self.children.setdefault(p, set()).add(c)
+            self.parents.setdefault(c, set()).add(p)
+        # Memoised transitive closures: id -> every goal reachable below / above it
+        self._down: dict[int, frozenset[int]] = {}
+        self._up: dict[int, frozenset[int]] = {}
+
+    @classmethod
+    def from_frames(cls, gs: pd.DataFrame, rels: pd.DataFrame) -> 'GoalGraph':
+        ids = pd.to_numeric(gs['id'], errors='coerce')
+        ids = [int(i) if pd.notna(i) else None for i in ids.tolist()]
+        e = rels[['parent_id', 'child_id']].dropna().astype(int)
+        return cls(ids, zip(e['parent_id'].tolist(), e['child_id'].tolist()))
+
+    # ----- lookups -----
+
+    def __contains__(self, goal_id) -> bool:
+        return goal_id in self.row
+
+    def __len__(self) -> int:
+        return len(self.row)
+
+    def ids(self) -> set[int]:
+        return {i for i in self.row if i is not None}
+
+    def children_of(self, goal_id: int) -> set[int]:
+        return self.children.get(goal_id, set())
+
+    def parents_of(self, goal_id: int) -> set[int]:
+        return self.parents.get(goal_id, set())
+
+    def has_edge(self, parent_id: int, child_id: int) -> bool:
+        return child_id in self.children.get(parent_id, ())
+
+    def is_linked(self, goal_id: int) -> bool:
+        return bool(self.children.get(goal_id)) or bool(self.parents.get(goal_id))
+
+    # ----- reachability -----
+
+    @staticmethod
+    def _closure(goal_id: int, adj: dict, memo: dict) -> frozenset[int]:
+        hit = memo.get(goal_id)
+        if hit is not None:
+            return hit
+        seen: set[int] = set()
+        stack = [goal_id]
+        while stack:
+            for n in adj.get(stack.pop(), ()):
+                if n in seen:
+                    continue
+                seen.add(n)
+                done = memo.get(n)
+                if done is not None:
+                    seen |= done  # already complete, no need to walk below n
+                else:
+                    stack.append(n)
+        closure = memo[goal_id] = frozenset(seen)
+        return closure
+
+    def descendants(self, goal_id: int) -> frozenset[int]:
+        """Every goal below goal_id (children, grandchildren, ...)."""
+        return self._closure(goal_id, self.children, self._down)
+
+    def ancestors(self, goal_id: int) -> frozenset[int]:
+        """Every goal above goal_id (parents, grandparents, ...)."""
+        return self._closure(goal_id, self.parents, self._up)
+
+    def levels(self, goal_id: int, depth: int | None = None, up: bool = False) -> tuple[dict[int, int], set[int]]:
+        """({id: distance} for goals within `depth` links below goal_id (above, with up=True),
+        ids at the depth limit that have further links) -- the second set is what a lazy view can expand next."""
+        adj = self.parents if up else self.children
+        dist = {goal_id: 0}
+        frontier = [goal_id]
+        level = 0
+        while frontier and (depth is None or level < depth):
+            level += 1
+            nxt = []
+            for n in frontier:
+                for m in adj.get(n, ()):
+                    if m not in dist:
+                        dist[m] = level
+                        nxt.append(m)
+            frontier = nxt
+        return dist, {n for n in frontier if adj.get(n)}
+
+    # ----- validation -----
+
+    def reaches(self, start: int, target: int) -> bool:
+        """True if target is start or one of its descendants."""
+        return start == target or target in self.descendants(start)
+
+    def check_link(self, parent_id: int, child_id: int):
+        """Raise ValueError/CycleError if parent → child is not a valid new link.
+
+        Only the new child's descendants are searched, so the cost is bounded by
+        the subtree below the child rather than the whole graph.
+        """
+        if parent_id == child_id:
+            raise CycleError('A goal cannot be linked to itself')
+        if parent_id not in self.row or child_id not in self.row:
+            raise ValueError('Invalid goal ID')
+        if self.has_edge(parent_id, child_id):
+            return
+        if self.reaches(child_id, parent_id):
+            raise CycleError('Link would create a cycle: the parent is already below this goal')
+
+    def find_cycle(self) -> list[int] | None:
+        """Some cycle in the existing links (as a list of ids), or None."""
+        state: dict[int, int] = {}  # 1 = on the current path, 2 = done
+        for root in list(self.children):
+            if root in state:
+                continue
+            path = [root]
+            iters = [iter(self.children.get(root, ()))]
+            state[root] = 1
+            while iters:
+                nxt = next(iters[-1], None)
+                if nxt is None:
+                    state[path.pop()] = 2
+                    iters.pop()
+                elif state.get(nxt) == 1:
+                    return path[path.index(nxt):] + [nxt]
+                elif nxt not in state:
+                    state[nxt] = 1
+                    path.append(nxt)
+                    iters.append(iter(self.children.get(nxt, ())))
+        return None
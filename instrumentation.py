@@ -0,0 +1,176 @@
+"""Per-request phase timings, exposed as Server-Timing headers and Prometheus histograms.
+
+Enabled with KOKO_ROADMAP_TIMING=1. When off, timed() hands back a shared no-op
+(and leaves decorated functions untouched), so the hooks cost nothing.
+
+    @timed('xlsx_read')
+    def _read_workbook(...): ...
+
+    with timed('view_model'):
+        ...
+
+Phases may nest (a view-model build can trigger a read); each is reported on
+its own, so durations in one response can overlap.
+"""
+from __future__ import annotations
+import contextvars
+import functools
+import os
+import threading
+import time
+
+ENABLED = os.environ.get('KOKO_ROADMAP_TIMING', '0') == '1'
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Phases recorded during the current request: {phase: [seconds, count]}
+_request_phases: contextvars.ContextVar[dict | None] = contextvars.ContextVar('request_phases', default=None)
+_starts = threading.local()
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...]):
+        self.name, self.help, self.labels = name, help_text, labels
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values: tuple, seconds: float):
+        with self._lock:
+            s = self._series.get(label_values)
+            if s is None:
+                s = self._series[label_values] = [[0] * len(BUCKETS), 0.0, 0]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    s[0][i] += 1
+            s[1] += seconds
+            s[2] += 1
+
+    def exposition(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+            for values, (buckets, total, count) in series:
+                labels = ','.join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values))
+                sep = ',' if labels else ''
+                for bound, n in zip(BUCKETS, buckets):
+                    lines.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {n}')
+                lines.append(f'{self.name}_bucket{{{labels}{sep}le="+Inf"}} {count}')
+                lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+                lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return lines
+
+
+def _escape(v) -> str:
+    return str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+PHASES = Histogram('koko_roadmap_phase_seconds', 'Time spent in each request phase.', ('phase',))
+REQUESTS = Histogram('koko_roadmap_request_seconds', 'Total request time by endpoint.', ('method', 'endpoint'))
+
+
+def record(phase: str, seconds: float):
+    PHASES.observe((phase,), seconds)
+    phases = _request_phases.get()
+    if phases is not None:
+        acc = phases.setdefault(phase, [0.0, 0])
+        acc[0] += seconds
+        acc[1] += 1
+
+
+class _Phase:
+    """Context manager and decorator timing one phase; safe to share between threads."""
+
+    def __init__(self, phase: str):
+        self.phase = phase
+
+    def __enter__(self):
+        stack = getattr(_starts, 'stack', None)
+        if stack is None:
+            stack = _starts.stack = []
+        stack.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        record(self.phase, time.perf_counter() - _starts.stack.pop())
+        return False
+
+    def __call__(self, fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with self:
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+class _Off:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __call__(self, fn):
+        return fn
+
+
+_OFF = _Off()
+
+
+def timed(phase: str):
+    """Time a block or a function as `phase` of the current request (no-op unless enabled)."""
+    return _Phase(phase) if ENABLED else _OFF
+
+
+def server_timing(phases: dict, total: float) -> str:
+    parts = [f'{name};dur={secs * 1000:.1f}' + (f';desc="x{n}"' if n > 1 else '')
+             for name, (secs, n) in phases.items()]
+    parts.append(f'total;dur={total * 1000:.1f}')
+    return ', '.join(parts)
+
+
+def metrics_text() -> str:
+    lines = [f'# koko_roadmap timing {"enabled" if ENABLED else "disabled (set KOKO_ROADMAP_TIMING=1)"}']
+    lines += PHASES.exposition() + REQUESTS.exposition()
+    return '\n'.join(lines) + '\n'
+
+
+def init_app(app):
+    """Hook request timing and template rendering into a Flask app (no-op unless enabled).
+
+    Call before registering other before_request hooks so their time is included.
+    """
+    if not ENABLED:
+        return
+    from flask import before_render_template, g, request, template_rendered
+
+    @app.before_request
+    def _timing_start():
+        g._timing_start = time.perf_counter()
+        g._timing_token = _request_phases.set({})
+
+    @app.after_request
+    def _timing_finish(response):
+        start = g.pop('_timing_start', None)
+        token = g.pop('_timing_token', None)
+        if start is None:
+            return response
+        total = time.perf_counter() - start
+        phases = _request_phases.get() or {}
+        _request_phases.reset(token)
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        REQUESTS.observe((request.method, endpoint), total)
+        response.headers['Server-Timing'] = server_timing(phases, total)
+        return response
+
+    render = _Phase('render')
+
+    def _render_start(sender, template, context, **extra):
+        render.__enter__()
+
+    def _render_end(sender, template, context, **extra):
+        render.__exit__(None, None, None)
+
+    before_render_template.connect(_render_start, app, weak=False)
+    template_rendered.connect(_render_end, app, weak=False)
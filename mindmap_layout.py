@@ -0,0 +1,122 @@
+"""Server-side layered layout for the mindmap (left-to-right, dagre-like).
+
+Produces cytoscape "preset" positions keyed by element id ('goal-<id>', and
+'root' for the virtual root added when there are several roots), using the same
+node sizes and spacing options the page used to hand to dagre.
+"""
+from __future__ import annotations
+from collections import defaultdict
+
+from excel_dal import read_goals, read_relationships, per_version
+from instrumentation import timed
+import tag_index
+from sankey_layout import minimize_crossings
+import view_models as vm
+
+NODE_SEP = 50
+RANK_SEP = 100
+SPACING_FACTOR = 1.2
+NODE_HEIGHT = 30
+ROOT_ID = 'root'
+
+def label_width(name: str) -> int:
+    label = name[:30] + '...' if len(name) > 30 else name
+    return min(len(label) * 7, 150)
+
+def _acyclic(ids: list, edges: list[tuple]) -> list[tuple]:
+    """Drop the edges that close a cycle (found by DFS), so ranks are well defined."""
+    children = defaultdict(list)
+    for p, c in edges:
+        children[p].append(c)
+    state, back = {}, set()
+    for root in ids:
+        if root in state:
+            continue
+        state[root] = 1
+        stack = [(root, iter(children[root]))]
+        while stack:
+            node, it = stack[-1]
+            nxt = next(it, None)
+            if nxt is None:
+                state[node] = 2
+                stack.pop()
+            elif state.get(nxt) == 1:
+                back.add((node, nxt))
+            elif nxt not in state:
+                state[nxt] = 1
+                stack.append((nxt, iter(children[nxt])))
+    return [e for e in edges if e not in back]
+
+def _ranks(ids: list, edges: list[tuple]) -> dict:
+    """Longest-path layering: every node sits one rank right of its deepest parent."""
+    indeg = {i: 0 for i in ids}
+    children = defaultdict(list)
+    for p, c in edges:
+        children[p].append(c)
+        indeg[c] += 1
+    rank = {i: 0 for i in ids}
+    queue = [i for i in ids if indeg[i] == 0]
+    while queue:
+        n = queue.pop()
+        for c in children[n]:
+            rank[c] = max(rank[c], rank[n] + 1)
+            indeg[c] -= 1
+            if indeg[c] == 0:
+                queue.append(c)
+    return rank
+
+def build_positions(goals: list[dict], edges: list[dict]) -> dict:
+    """{element id: {'x', 'y'}} for the goals and edges shown on the mindmap."""
+    names = {g['id']: g.get('name') or '' for g in goals}
+    ids = list(names)
+    links = list(dict.fromkeys((e['parent'], e['child']) for e in edges if e['parent'] in names and e['child'] in names))
+    has_parent = {c for _, c in links}
+    roots = [i for i in ids if i not in has_parent]
+    widths = {i: label_width(names[i]) for i in ids}
+    if len(roots) > 1:
+        ids = [ROOT_ID] + ids
+        links = [(ROOT_ID, r) for r in roots] + links
+        widths[ROOT_ID] = 100
+    links = _acyclic(ids, links)
+
+    rank = _ranks(ids, links)
+    levels = [[] for _ in range(max(rank.values(), default=-1) + 1)]
+    for i in ids:
+        levels[rank[i]].append(i)
+    levels = minimize_crossings(levels, links)
+
+    node_sep = NODE_SEP * SPACING_FACTOR
+    rank_sep = RANK_SEP * SPACING_FACTOR
+    parents = defaultdict(list)
+    for p, c in links:
+        parents[c].append(p)
+
+    pos: dict = {}
+    x = 0.0
+    for level in levels:
+        col_width = max(widths[i] for i in level)
+        cx = x + col_width / 2
+        # Aim each node at the mean height of its parents, then push apart in order
+        want = []
+        for k, i in enumerate(level):
+            ys = [pos[p]['y'] for p in parents[i] if p in pos]
+            want.append(sum(ys) / len(ys) if ys else k * (NODE_HEIGHT + node_sep))
+        ys = []
+        for w in want:
+            ys.append(w if not ys else max(w, ys[-1] + NODE_HEIGHT + node_sep))
+        shift = sum(w - y for w, y in zip(want, ys)) / len(ys)
+        for i, y in zip(level, ys):
+            pos[i] = {'x': round(cx, 1), 'y': round(y + shift, 1)}
+        x += col_width + rank_sep
+
+    return {(i if i == ROOT_ID else f'goal-{i}'): p for i, p in pos.items()}
+
+@per_version
+@timed('layout')
+def positions(tags: tuple = (), mode: str = 'any') -> dict:
+    """Preset positions for /mindmap (optionally tag-filtered), computed once per data version."""
+    gs = vm.visible_goals(read_goals())
+    tagged = tag_index.goal_ids(tags, mode)
+    if tagged is not None:
+        gs = gs[gs['id'].isin(tagged)]
+    return build_positions(vm.goal_payload(gs, ['id', 'name']), vm.edge_list(read_relationships()))
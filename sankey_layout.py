@@ -0,0 +1,190 @@
+"""Server-side Sankey layout: level assignment, crossing minimisation and flows.
+
+A port of the buildFilteredLevels/minimizeCrossings code that used to run in
+sankey.html, returning arrays ready to hand to Plotly. Layouts are cached per
+data version and filter (see layout()).
+"""
+from __future__ import annotations
+from collections import defaultdict
+
+from excel_dal import read_goals, read_relationships, per_version
+from instrumentation import timed
+import tag_index
+import view_models as vm
+
+MAX_ITERATIONS = 10
+
+def build_levels(allowed: list[int], edges: list[tuple[int, int]]) -> list[list[int]]:
+    """Depth-first level assignment: roots on level 0, each child one below where it is first reached."""
+    children = defaultdict(list)
+    has_parent = set()
+    for p, c in edges:
+        children[p].append(c)
+        has_parent.add(c)
+    levels: list[list[int]] = []
+    seen: set[int] = set()
+
+    def visit(root: int):
+        stack = [(root, 0)]
+        while stack:
+            node, level = stack.pop()
+            if node in seen:
+                continue
+            seen.add(node)
+            while len(levels) <= level:
+                levels.append([])
+            levels[level].append(node)
+            # Reversed so children are visited in edge order, as the recursive version did
+            for c in reversed(children.get(node, ())):
+                if c not in seen:
+                    stack.append((c, level + 1))
+
+    for gid in allowed:
+        if gid not in has_parent:
+            visit(gid)
+    # Goals only reachable through a cycle start a tree of their own
+    for gid in allowed:
+        if gid not in seen:
+            visit(gid)
+    return levels
+
+def _count_crossings(edges, level_of, pos) -> int:
+    """Pairs of edges between the same two levels whose endpoints are in opposite order."""
+    groups = defaultdict(list)
+    for p, c in edges:
+        groups[(level_of[p], level_of[c])].append((pos[p], pos[c]))
+    total = 0
+    for pairs in groups.values():
+        if len(pairs) < 2:
+            continue
+        pairs.sort()
+        # Inversions in the child positions, counted with a Fenwick tree
+        ranks = {v: i + 1 for i, v in enumerate(sorted({c for _, c in pairs}))}
+        tree = [0] * (len(ranks) + 1)
+        seen = 0
+        for _, c in pairs:
+            r = ranks[c]
+            le, i = 0, r
+            while i > 0:
+                le += tree[i]
+                i -= i & -i
+            total += seen - le
+            i = r
+            while i < len(tree):
+                tree[i] += 1
+                i += i & -i
+            seen += 1
+    return total
+
+def minimize_crossings(levels: list[list[int]], edges: list[tuple[int, int]]) -> list[list[int]]:
+    """Weighted-median ordering, alternating downward and upward sweeps; keeps the best seen."""
+    if len(levels) < 2:
+        return levels
+    level_of = {n: i for i, level in enumerate(levels) for n in level}
+    edges = [(p, c) for p, c in edges if p in level_of and c in level_of]
+    fwd = defaultdict(list)  # parent -> [(child, child level)]
+    back = defaultdict(list)  # child -> [(parent, parent level)]
+    for p, c in edges:
+        fwd[p].append((c, level_of[c]))
+        back[c].append((p, level_of[p]))
+
+    current = [list(level) for level in levels]
+    pos = {n: i for level in current for i, n in enumerate(level)}
+
+    def median(node, conns, level_idx):
+        ps = sorted((pos[n], 1 / (abs(lvl - level_idx) or 1)) for n, lvl in conns.get(node, ()))
+        if not ps:
+            return None
+        half = sum(w for _, w in ps) / 2
+        cum = 0.0
+        for p, w in ps:
+            cum += w
+            if cum >= half:
+                return p
+        return ps[len(ps) // 2][0]
+
+    def reorder(level_idx, conns):
+        level = current[level_idx]
+        meds = {n: median(n, conns, level_idx) for n in level}
+        level.sort(key=lambda n: (meds[n] is None, meds[n] or 0))
+        for i, n in enumerate(level):
+            pos[n] = i
+
+    best = [list(level) for level in current]
+    best_crossings = _count_crossings(edges, level_of, pos)
+    for _ in range(MAX_ITERATIONS):
+        for i in range(1, len(current)):
+            reorder(i, back)
+        for i in range(len(current) - 2, -1, -1):
+            reorder(i, fwd)
+        crossings = _count_crossings(edges, level_of, pos)
+        if crossings < best_crossings:
+            best_crossings = crossings
+            best = [list(level) for level in current]
+        if crossings == 0:
+            break
+    return best
+
+def build_layout(goals: list[dict], edges: list[dict], goal_ids: list[int] | None = None) -> dict:
+    """Plotly sankey node/link arrays for `goals`, or just those in goal_ids (in that order) if given."""
+    by_id = {g['id']: g for g in goals}
+    allowed = [i for i in dict.fromkeys(goal_ids) if i in by_id] if goal_ids else list(by_id)
+    allowed_set = set(allowed)
+    links = [(e['parent'], e['child']) for e in edges if e['parent'] in allowed_set and e['child'] in allowed_set]
+
+    levels = minimize_crossings(build_levels(allowed, links), links)
+
+    labels, xs, ys, custom = [], [], [], []
+    node_index: dict[int, int] = {}
+    span = max(len(levels) - 1, 1)
+    for li, level in enumerate(levels):
+        n = len(level) or 1
+        for i, gid in enumerate(level):
+            node_index[gid] = len(labels)
+            labels.append(by_id[gid].get('name') or '')
+            xs.append(li / span)
+            ys.append((i + 1) / (n + 1))
+            custom.append(gid)
+        if not level:
+            # Invisible placeholder keeps columns stable
+            labels.append('')
+            xs.append(li / span)
+            ys.append(0.5)
+            custom.append(None)
+
+    # Flow conservation: roots carry 1, each node splits its inflow evenly among its children
+    source, target, value = [], [], []
+    incoming = defaultdict(list)
+    outgoing = defaultdict(list)
+    link_of = {}
+    for p, c in links:
+        if (p, c) in link_of:
+            continue
+        link_of[(p, c)] = len(source)
+        source.append(node_index[p])
+        target.append(node_index[c])
+        value.append(0.0)
+        incoming[c].append(link_of[(p, c)])
+        outgoing[p].append(link_of[(p, c)])
+    for level in levels:
+        for gid in level:
+            inflow = sum(value[i] for i in incoming[gid]) if incoming[gid] else 1
+            for i in outgoing[gid]:
+                value[i] = inflow / len(outgoing[gid])
+
+    return dict(
+        node=dict(label=labels, x=xs, y=ys, customdata=custom),
+        link=dict(source=source, target=target, value=value),
+        levels=levels,
+    )
+
+@per_version
+@timed('layout')
+def layout(goal_ids: tuple = (), tags: tuple = (), mode: str = 'any') -> dict:
+    """Cached layout for the visible goals; pass goal_ids/tags as tuples (empty = no filter)."""
+    gs = vm.visible_goals(read_goals())
+    tagged = tag_index.goal_ids(tags, mode)
+    if tagged is not None:
+        gs = gs[gs['id'].isin(tagged)]
+    goals = vm.goal_payload(gs, ['id', 'name'])
+    return build_layout(goals, vm.edge_list(read_relationships()), list(goal_ids))
@@ -0,0 +1,151 @@
+"""Inverted full-text index over goal names, descriptions and tags.
+
+Built from read_goals() on first use, then patched in place by this process's
+own edits (excel_dal.on_change) instead of being rebuilt. An edit made by
+another worker shows up as a data version the index has not seen, and the next
+search rebuilds it.
+
+Every query word matches as a prefix ("plat" finds "platform"), all words must
+match, and hits are ranked by where they matched: name over tags over
+description, whole words over prefixes.
+"""
+from __future__ import annotations
+import bisect
+import re
+import threading
+
+import pandas as pd
+
+from excel_dal import data_version, on_change, read_goals
+from instrumentation import timed
+import view_models as vm
+
+# Field weights; a whole-word match scores double a prefix match
+WEIGHTS = {'name': 3, 'tags': 2, 'description': 1}
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text) -> list[str]:
+    return _WORD.findall(str(text).lower()) if text else []
+
+
+class SearchIndex:
+    __slots__ = ('version', 'docs', 'postings', 'terms')
+
+    def __init__(self, version: str):
+        self.version = version
+        # id -> {'name', 'description', 'tags'} as indexed, for updates and result names
+        self.docs: dict[int, dict[str, str]] = {}
+        # term -> {goal id: best field weight}
+        self.postings: dict[str, dict[int, int]] = {}
+        # every term with postings, sorted, for prefix ranges
+        self.terms: list[str] = []
+
+    @classmethod
+    def from_frame(cls, gs: pd.DataFrame, version: str) -> 'SearchIndex':
+        idx = cls(version)
+        gs = vm.valid_goals(gs)
+        fields = {f: vm.clean_text(gs[f]).astype(str).tolist() for f in WEIGHTS}
+        for i, gid in enumerate(gs['id'].tolist()):
+            idx.add(gid, **{f: fields[f][i] for f in WEIGHTS})
+        return idx
+
+    # ----- maintenance -----
+
+    def add(self, goal_id: int, name: str = '', description: str = '', tags: str = ''):
+        if goal_id in self.docs:
+            self.remove(goal_id)
+        doc = self.docs[goal_id] = {'name': name or '', 'description': description or '', 'tags': tags or ''}
+        for field, weight in WEIGHTS.items():
+            for term in tokenize(doc[field]):
+                posting = self.postings.get(term)
+                if posting is None:
+                    posting = self.postings[term] = {}
+                    bisect.insort(self.terms, term)
+                if posting.get(goal_id, 0) < weight:
+                    posting[goal_id] = weight
+
+    def remove(self, goal_id: int):
+        doc = self.docs.pop(goal_id, None)
+        if doc is None:
+            return
+        for term in {t for f in WEIGHTS for t in tokenize(doc[f])}:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(goal_id, None)
+            if not posting:
+                del self.postings[term]
+                del self.terms[bisect.bisect_left(self.terms, term)]
+
+    # ----- queries -----
+
+    def _word_scores(self, word: str) -> dict[int, int]:
+        scores: dict[int, int] = {}
+        i = bisect.bisect_left(self.terms, word)
+        while i < len(self.terms) and self.terms[i].startswith(word):
+            term = self.terms[i]
+            bonus = 2 if term == word else 1
+            for gid, weight in self.postings[term].items():
+                s = weight * bonus
+                if scores.get(gid, 0) < s:
+                    scores[gid] = s
+            i += 1
+        return scores
+
+    def search(self, query: str, limit: int = 20) -> list[dict]:
+        """Best matches for every word of `query`, as [{'id', 'name', 'score'}]."""
+        words = tokenize(query)
+        if not words:
+            return []
+        total: dict[int, int] | None = None
+        # Rarest-looking (longest) words first narrows the candidates soonest
+        for word in sorted(set(words), key=len, reverse=True):
+            scores = self._word_scores(word)
+            if total is None:
+                total = scores
+            else:
+                total = {gid: s + scores[gid] for gid, s in total.items() if gid in scores}
+            if not total:
+                return []
+        ranked = sorted(total.items(), key=lambda kv: (-kv[1], self.docs[kv[0]]['name'].lower(), kv[0]))
+        return [{'id': gid, 'name': self.docs[gid]['name'], 'score': s} for gid, s in ranked[:limit]]
+
+
+_index: SearchIndex | None = None
+_lock = threading.Lock()
+
+
+@timed('view_model')
+def _build(version: str) -> SearchIndex:
+    return SearchIndex.from_frame(read_goals(), version)
+
+
+def search(query: str, limit: int = 20) -> list[dict]:
+    global _index
+    version = data_version()
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = _build(version)
+        return _index.search(query, limit)
+
+
+@on_change
+def _apply(op: str, args: dict, before: str, after: str):
+    # Patch the index for an edit made here, if it was current just before it
+    global _index
+    with _lock:
+        idx = _index
+        if idx is None or idx.version != before:
+            return
+        if op in ('add_goal', 'update_goal'):
+            old = idx.docs.get(args['goal_id'], {})
+            idx.add(args['goal_id'], name=args['name'], description=args['description'],
+                    tags=old.get('tags', '') if args['tags'] is None else args['tags'])
+        elif op == 'delete_goal':
+            idx.remove(args['goal_id'])
+        elif op not in ('link', 'set_links', 'flush'):
+            _index = None  # e.g. a bulk import: rebuild on the next search
+            return
+        idx.version = after
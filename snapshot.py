@@ -0,0 +1,157 @@
+"""Columnar snapshots of the workbook's sheets, memory-mapped by every worker.
+
+After each save (and after a worker has had to parse a workbook it found
+without one), the typed frames are written next to the workbook as one
+directory per data version:
+
+    roadmap.xlsx.snapshot/<version>/manifest.json
+    roadmap.xlsx.snapshot/<version>/<sheet>.<n>.npy ...
+
+Each version is written under a temporary name and renamed into place, so a
+reader sees all of it or none. Readers look up the directory for the workbook
+version they are about to cache -- a workbook changed by anything else simply
+has no snapshot yet -- and np.load(mmap_mode='r') the numeric and date
+columns, so their pages are shared by every worker instead of copied into
+each. numpy has no memory-mappable string type, so text columns are stored as
+one UTF-8 buffer plus offsets and decoded on load, which is still far cheaper
+than parsing the xlsx.
+
+Column kinds follow excel_dal.SCHEMA: 'int' (nullable Int64), 'date'
+(datetime64[ns]), 'text' and 'any' (object; the latter JSON-encoded).
+"""
+from __future__ import annotations
+import datetime as dt
+import json
+import os
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+MANIFEST = 'manifest.json'
+
+
+def version_name(key: tuple) -> str:
+    return '-'.join(format(k, 'x') for k in key)
+
+
+# ----- WRITING -----
+
+def _encode_any(v):
+    # Lossless JSON for the cell values openpyxl hands back
+    if isinstance(v, (dt.datetime, pd.Timestamp)):
+        return {'$datetime': v.isoformat()}
+    if isinstance(v, dt.date):
+        return {'$date': v.isoformat()}
+    if isinstance(v, dt.time):
+        return {'$time': v.isoformat()}
+    if isinstance(v, np.generic):
+        return v.item()
+    if v is pd.NaT or v is pd.NA:
+        return None
+    return v
+
+
+def _write_column(d: Path, stem: str, kind: str, s: pd.Series):
+    if kind == 'int':
+        np.save(d / f'{stem}.npy', s.fillna(0).to_numpy(dtype='int64'))
+        np.save(d / f'{stem}.mask.npy', s.isna().to_numpy())
+    elif kind == 'date':
+        np.save(d / f'{stem}.npy', s.to_numpy(dtype='datetime64[ns]'))
+    elif kind == 'text':
+        null = s.isna().to_numpy()
+        encoded = [b'' if n else str(v).encode('utf-8') for v, n in zip(s.tolist(), null)]
+        np.save(d / f'{stem}.offsets.npy', np.cumsum([0] + [len(b) for b in encoded], dtype='int64'))
+        np.save(d / f'{stem}.mask.npy', null)
+        (d / f'{stem}.utf8').write_bytes(b''.join(encoded))
+    else:
+        (d / f'{stem}.json').write_text(json.dumps([_encode_any(v) for v in s.tolist()]), encoding='utf-8')
+
+
+def write(root: str, key: tuple, frames: dict[str, pd.DataFrame], kinds: dict[str, dict[str, str]],
+          sheetnames: list[str]) -> bool:
+    """Publish frames as the snapshot for workbook `key`; False if one was already there."""
+    root = Path(root)
+    final = root / version_name(key)
+    if final.exists():
+        return False
+    tmp = root / f'.tmp-{os.getpid()}-{threading.get_ident()}'
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    try:
+        manifest = {'key': list(key), 'sheetnames': sheetnames, 'sheets': {}}
+        for sheet, df in frames.items():
+            cols = []
+            for i, name in enumerate(df.columns):
+                kind = kinds.get(sheet, {}).get(name, 'any')
+                _write_column(tmp, f'{sheet}.{i}', kind, df[name])
+                cols.append([name, kind])
+            manifest['sheets'][sheet] = {'rows': len(df), 'columns': cols}
+        # Written last: a directory without a manifest is never read
+        (tmp / MANIFEST).write_text(json.dumps(manifest), encoding='utf-8')
+        try:
+            os.rename(tmp, final)
+        except OSError:  # another worker published the same version first
+            return False
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    prune(root, keep=final.name)
+    return True
+
+
+def prune(root, keep: str):
+    """Drop every other version. Readers still mapping one keep their pages; one about to open it falls back to parsing."""
+    try:
+        names = os.listdir(root)
+    except FileNotFoundError:
+        return
+    for name in names:
+        if name != keep and not name.startswith('.tmp-'):
+            shutil.rmtree(Path(root) / name, ignore_errors=True)
+
+
+# ----- READING -----
+
+def _decode_any(v):
+    if isinstance(v, dict) and len(v) == 1:
+        (tag, text), = v.items()
+        if tag == '$datetime':
+            return dt.datetime.fromisoformat(text)
+        if tag == '$date':
+            return dt.date.fromisoformat(text)
+        if tag == '$time':
+            return dt.time.fromisoformat(text)
+    return v
+
+
+def _read_column(d: Path, stem: str, kind: str, rows: int) -> pd.Series:
+    def mapped(suffix):
+        return np.asarray(np.load(d / f'{stem}{suffix}.npy', mmap_mode='r'))
+    if kind == 'int':
+        return pd.Series(pd.arrays.IntegerArray(mapped(''), mapped('.mask')), copy=False)
+    if kind == 'date':
+        return pd.Series(mapped(''), copy=False)
+    if kind == 'text':
+        offsets, null = mapped('.offsets').tolist(), mapped('.mask').tolist()
+        data = (d / f'{stem}.utf8').read_bytes()
+        return pd.Series([None if null[i] else data[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(rows)],
+                         dtype=object)
+    values = json.loads((d / f'{stem}.json').read_text(encoding='utf-8'))
+    return pd.Series([_decode_any(v) for v in values], dtype=object)
+
+
+def read(root: str, key: tuple) -> tuple[dict[str, pd.DataFrame], list[str]] | None:
+    """(frames by sheet, workbook sheet names) of the snapshot for `key`, or None if there is none."""
+    d = Path(root) / version_name(key)
+    try:
+        manifest = json.loads((d / MANIFEST).read_text(encoding='utf-8'))
+        frames = {}
+        for sheet, meta in manifest['sheets'].items():
+            data = {name: _read_column(d, f'{sheet}.{i}', kind, meta['rows'])
+                    for i, (name, kind) in enumerate(meta['columns'])}
+            frames[sheet] = pd.DataFrame(data, index=pd.RangeIndex(meta['rows']), copy=False)
+    except FileNotFoundError:
+        return None  # not published yet, or pruned while we looked
+    return frames, manifest['sheetnames']
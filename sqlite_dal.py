@@ -0,0 +1,293 @@
+"""SQLite storage engine with the same public API as excel_dal.
+
+Selected with KOKO_ROADMAP_BACKEND=sqlite. The workbook then only serves as an
+interchange format:
+
+    python sqlite_dal.py import [roadmap.xlsx]   # replace DB contents from a workbook
+    python sqlite_dal.py export [roadmap.xlsx]   # write DB contents to a workbook
+
+A fresh database is seeded from KOKO_ROADMAP_XLSX automatically if that file exists.
+"""
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+from pathlib import Path
+import pandas as pd
+
+from instrumentation import timed
+
+DB_PATH = os.environ.get('KOKO_ROADMAP_DB', 'roadmap.db')
+
+GOAL_COLUMNS = ['id','name','start_date','due_date','description','display','tags']
+REL_COLUMNS = ['parent_id','child_id']
+CHANGELOG_COLUMNS = ['date','version','note','author']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS goals (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    start_date TEXT,
+    due_date TEXT,
+    description TEXT,
+    display INTEGER,
+    tags TEXT
+);
+CREATE TABLE IF NOT EXISTS relationships (
+    parent_id INTEGER NOT NULL,
+    child_id INTEGER NOT NULL,
+    PRIMARY KEY (parent_id, child_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ix_relationships_child ON relationships(child_id, parent_id);
+CREATE TABLE IF NOT EXISTS changelog (date TEXT, version TEXT, note TEXT, author TEXT);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+"""
+
+_local = threading.local()
+_ready = False
+_ready_lock = threading.Lock()
+
+def _dal():
+    # Imported lazily: excel_dal imports this module when the sqlite backend is selected.
+    import excel_dal
+    return excel_dal
+
+def _conn() -> sqlite3.Connection:
+    # One connection per thread (and per process, since workers fork before first use)
+    c = getattr(_local, 'conn', None)
+    if c is None or getattr(_local, 'pid', None) != os.getpid():
+        c = sqlite3.connect(DB_PATH, timeout=5, isolation_level=None, check_same_thread=False)
+        c.execute('PRAGMA journal_mode=WAL')
+        c.execute('PRAGMA synchronous=NORMAL')
+        _local.conn, _local.pid = c, os.getpid()
+    return c
+
+class _Tx:
+    """BEGIN IMMEDIATE ... COMMIT, bumping the data version if anything changed.
+
+    `op` and `args` describe the edit to excel_dal's change listeners (same
+    names as excel_dal's journal ops); they are told only if it committed.
+    """
+    def __init__(self, op: str, **args):
+        self.op, self.args = op, args
+
+    def __enter__(self):
+        ensure_workbook()
+        self.c = _conn()
+        self.changed = False
+        try:
+            self.c.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError as e:
+            raise _dal().WriteLockedError(f"{DB_PATH} is locked by another writer. Try again.") from e
+        self.before = self.c.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.c.execute('ROLLBACK')
+            return False
+        if self.changed:
+            self.c.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+        self.c.execute('COMMIT')
+        if self.changed:
+            _dal()._notify(self.op, self.args, f'db-{self.before}', f'db-{self.before + 1}')
+        return False
+
+def ensure_workbook(seed: bool = True):
+    """Create the schema on first use; seed a brand-new database from the workbook (unless seed=False)."""
+    global _ready
+    if _ready:
+        return
+    with _ready_lock:
+        if _ready:
+            return
+        fresh = not Path(DB_PATH).exists()
+        _conn().executescript(_SCHEMA)
+        _ready = True
+    if seed and fresh and Path(_dal().EXCEL_PATH).exists():
+        import_xlsx(_dal().EXCEL_PATH)
+
+def _version() -> int:
+    ensure_workbook()
+    return _conn().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+def data_version() -> str:
+    return f'db-{_version()}'
+
+def _db_key() -> tuple:
+    return ('db', _version())
+
+def _iso_or_blank(v) -> str:
+    if not v:
+        return ''
+    d = pd.to_datetime(v, errors='coerce')
+    return '' if pd.isna(d) else d.date().isoformat()
+
+def _none_if_nan(v):
+    return None if (v is None or (not isinstance(v, str) and pd.isna(v)) or str(v).lower() == 'nan') else v
+
+# ----- READERS -----
+
+@timed('db_query')
+def _query(sql: str, columns: list[str]) -> pd.DataFrame:
+    cur = _conn().execute(sql)
+    return pd.DataFrame.from_records(cur.fetchall(), columns=columns)
+
+def read_changelog() -> pd.DataFrame:
+    return _dal()._cached('db:changelog', lambda: _query('SELECT date, version, note, author FROM changelog', CHANGELOG_COLUMNS), _db_key)
+
+def read_goals() -> pd.DataFrame:
+    def load():
+        df = _query('SELECT id, name, start_date, due_date, description, display, tags FROM goals ORDER BY id', GOAL_COLUMNS)
+        return _dal()._typed('goals', df)
+    return _dal()._cached('db:goals', load, _db_key)
+
+def read_relationships() -> pd.DataFrame:
+    def load():
+        return _dal()._typed('relationships', _query('SELECT parent_id, child_id FROM relationships', REL_COLUMNS))
+    return _dal()._cached('db:relationships', load, _db_key)
+
+# ----- UPDATERS -----
+
+def update_goal(goal_id: int, name: str, due_date: str, description: str, display: int | None = None, tags: str | None = None, start_date: str | None = None):
+    sets = {'name': name, 'due_date': _iso_or_blank(due_date), 'description': description}
+    if start_date is not None:
+        sets['start_date'] = _iso_or_blank(start_date)
+    if display is not None:
+        sets['display'] = int(display)
+    if tags is not None:
+        sets['tags'] = tags
+    cols = ', '.join(f'{k} = ?' for k in sets)
+    with _Tx('update_goal', goal_id=int(goal_id), name=name, due_date=due_date, description=description,
+             display=None if display is None else int(display), tags=tags, start_date=start_date) as tx:
+        cur = tx.c.execute(f'UPDATE goals SET {cols} WHERE id = ?', [*sets.values(), int(goal_id)])
+        if cur.rowcount == 0:
+            raise ValueError(f'Goal id {goal_id} not found')
+        tx.changed = True
+
+# ----- CREATORS -----
+
+def add_goal(name: str, due_date: str | None, description: str, display: int | None = None, tags: str | None = None, start_date: str | None = None):
+    rec = (name, _iso_or_blank(start_date), _iso_or_blank(due_date), description,
+           int(display) if display is not None else 1, tags if tags is not None else '')
+    with _Tx('add_goal', name=name, due_date=due_date, description=description,
+             display=None if display is None else int(display), tags=tags, start_date=start_date) as tx:
+        # INTEGER PRIMARY KEY assigns max(id)+1 inside the write transaction
+        cur = tx.c.execute('INSERT INTO goals (name, start_date, due_date, description, display, tags) VALUES (?, ?, ?, ?, ?, ?)', rec)
+        tx.args['goal_id'] = cur.lastrowid
+        tx.changed = True
+        return cur.lastrowid
+
+def add_goals(goals: list[dict], links=()) -> list[int]:
+    """Add many goals and links in one transaction (same arguments as excel_dal.add_goals)."""
+    with _Tx('add_goals') as tx:
+        first = tx.c.execute('SELECT COALESCE(MAX(id), 0) + 1 FROM goals').fetchone()[0]
+        ids = range(first, first + len(goals))
+        pairs = _dal()._check_bulk_links(_dal().goal_graph(), ids, links)
+        tx.c.executemany('INSERT INTO goals (id, name, start_date, due_date, description, display, tags) VALUES (?, ?, ?, ?, ?, ?, ?)', [
+            (gid, g.get('name'), _iso_or_blank(g.get('start_date')), _iso_or_blank(g.get('due_date')), g.get('description'),
+             1 if g.get('display') is None else int(g['display']), g.get('tags') or '')
+            for gid, g in zip(ids, goals)
+        ])
+        tx.c.executemany('INSERT INTO relationships (parent_id, child_id) VALUES (?, ?)', pairs)
+        tx.args.update(goal_ids=list(ids), links=len(pairs))
+        tx.changed = bool(ids or pairs)
+    return list(ids)
+
+# ----- DELETERS -----
+
+def delete_goal(goal_id: int):
+    with _Tx('delete_goal', goal_id=int(goal_id)) as tx:
+        cur = tx.c.execute('DELETE FROM goals WHERE id = ?', (int(goal_id),))
+        if cur.rowcount == 0:
+            raise ValueError(f'Goal id {goal_id} not found')
+        tx.changed = True
+
+# ----- RELATIONSHIP TOGGLERS -----
+
+def toggle_link_goal(parent_id: int, child_id: int, enabled: bool):
+    with _Tx('link', parent_id=int(parent_id), child_id=int(child_id), enabled=bool(enabled)) as tx:
+        if enabled:
+            # Checked under the write lock, against what this transaction sees
+            _dal().goal_graph().check_link(int(parent_id), int(child_id))
+            cur = tx.c.execute('INSERT OR IGNORE INTO relationships (parent_id, child_id) VALUES (?, ?)', (int(parent_id), int(child_id)))
+        else:
+            cur = tx.c.execute('DELETE FROM relationships WHERE parent_id = ? AND child_id = ?', (int(parent_id), int(child_id)))
+        tx.changed = cur.rowcount > 0
+
+def _set_links(own_col: str, other_col: str, goal_id: int, ids) -> bool:
+    goal_id = int(goal_id)
+    wanted = {int(i) for i in ids}
+    wanted.discard(goal_id)
+    with _Tx('set_links', own_col=own_col, goal_id=goal_id, ids=sorted(wanted)) as tx:
+        current = {r[0] for r in tx.c.execute(f'SELECT {other_col} FROM relationships WHERE {own_col} = ?', (goal_id,))}
+        gone, added = current - wanted, wanted - current
+        _dal()._check_new_links(own_col, goal_id, added)
+        tx.c.executemany(f'DELETE FROM relationships WHERE {own_col} = ? AND {other_col} = ?', [(goal_id, i) for i in gone])
+        tx.c.executemany(f'INSERT INTO relationships ({own_col}, {other_col}) VALUES (?, ?)', [(goal_id, i) for i in sorted(added)])
+        tx.changed = bool(gone or added)
+    return tx.changed
+
+def set_children(parent_id: int, child_ids) -> bool:
+    """Make child_ids exactly the children of parent_id. Returns True if anything changed."""
+    return _set_links('parent_id', 'child_id', parent_id, child_ids)
+
+def set_parents(child_id: int, parent_ids) -> bool:
+    """Make parent_ids exactly the parents of child_id. Returns True if anything changed."""
+    return _set_links('child_id', 'parent_id', child_id, parent_ids)
+
+# ----- IMPORT / EXPORT -----
+
+def import_xlsx(xlsx_path: str | None = None) -> dict:
+    """Replace the database contents with the goals/relationships/changelog sheets of a workbook."""
+    dal = _dal()
+    xlsx_path = xlsx_path or dal.EXCEL_PATH
+    by_name = dal._read_workbook(xlsx_path)
+    goals = by_name.get('goals', dal._typed_frame('goals', {}))
+    rels = by_name.get('relationships', dal._typed_frame('relationships', {}))
+    log = by_name.get('changelog', dal._typed_frame('changelog', {}))
+
+    goals = goals[goals['id'].notna()]
+    goal_rows = [
+        (int(r.id), _none_if_nan(r.name), _iso_or_blank(_none_if_nan(r.start_date)), _iso_or_blank(_none_if_nan(r.due_date)),
+         _none_if_nan(r.description), None if pd.isna(r.display) else int(r.display), _none_if_nan(r.tags))
+        for r in goals[GOAL_COLUMNS].itertuples(index=False)
+    ]
+    rels = rels.dropna(subset=REL_COLUMNS)
+    rel_rows = list(zip(rels['parent_id'].astype(int).tolist(), rels['child_id'].astype(int).tolist()))
+    log_rows = [tuple(_none_if_nan(v) for v in r) for r in log[CHANGELOG_COLUMNS].itertuples(index=False)]
+
+    ensure_workbook(seed=False)  # a fresh database gets this workbook only, not a seed from EXCEL_PATH first
+    with _Tx('import', path=str(xlsx_path)) as tx:
+        tx.c.execute('DELETE FROM goals')
+        tx.c.execute('DELETE FROM relationships')
+        tx.c.execute('DELETE FROM changelog')
+        tx.c.executemany('INSERT INTO goals (id, name, start_date, due_date, description, display, tags) VALUES (?, ?, ?, ?, ?, ?, ?)', goal_rows)
+        tx.c.executemany('INSERT OR IGNORE INTO relationships (parent_id, child_id) VALUES (?, ?)', rel_rows)
+        tx.c.executemany('INSERT INTO changelog (date, version, note, author) VALUES (?, ?, ?, ?)', log_rows)
+        tx.changed = True
+    return dict(goals=len(goal_rows), relationships=len(rel_rows), changelog=len(log_rows))
+
+def export_xlsx(xlsx_path: str | None = None) -> str:
+    """Write the database contents to a workbook (goals, relationships, changelog sheets)."""
+    dal = _dal()
+    xlsx_path = xlsx_path or dal.EXCEL_PATH
+    tmp = str(Path(xlsx_path).with_suffix('.tmp.xlsx'))
+    with pd.ExcelWriter(tmp, engine='openpyxl') as w:
+        dal._safe_to_excel(w, 'goals', read_goals())
+        dal._safe_to_excel(w, 'relationships', read_relationships())
+        dal._safe_to_excel(w, 'changelog', read_changelog())
+    os.replace(tmp, xlsx_path)
+    return xlsx_path
+
+if __name__ == '__main__':
+    import argparse
+    ap = argparse.ArgumentParser(description='Move roadmap data between the SQLite store and an xlsx workbook.')
+    ap.add_argument('command', choices=['import', 'export'])
+    ap.add_argument('xlsx', nargs='?', help='workbook path (default: KOKO_ROADMAP_XLSX)')
+    args = ap.parse_args()
+    if args.command == 'import':
+        print(import_xlsx(args.xlsx))
+    else:
+        print(export_xlsx(args.xlsx))
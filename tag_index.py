@@ -0,0 +1,54 @@
+"""Inverted tag index: tag -> set of goal ids, built once per data version.
+
+Tags are the comma-separated `tags` cell of each goal, matched exactly after
+trimming. Views filter with ?tags=a,b&mode=any|all (see goal_ids()).
+"""
+from __future__ import annotations
+
+import pandas as pd
+
+from excel_dal import read_goals, per_version
+from instrumentation import timed
+import view_models as vm
+
+MODES = ('any', 'all')
+
+
+class TagIndex:
+    __slots__ = ('ids_by_tag',)
+
+    def __init__(self, gs: pd.DataFrame):
+        gs = vm.valid_goals(gs)
+        tags = vm.clean_text(gs['tags']).astype(str).str.split(',').explode().str.strip()
+        pairs = pd.DataFrame({'tag': tags, 'id': gs['id'].reindex(tags.index)})
+        pairs = pairs[pairs['tag'] != '']
+        self.ids_by_tag: dict[str, set[int]] = {t: set(ids) for t, ids in pairs.groupby('tag')['id']}
+
+    def tags(self, among: set[int] | None = None) -> list[str]:
+        """Sorted tags, optionally only those carried by at least one goal in `among`."""
+        return sorted(t for t, ids in self.ids_by_tag.items() if among is None or not ids.isdisjoint(among))
+
+    def counts(self) -> dict[str, int]:
+        return {t: len(self.ids_by_tag[t]) for t in sorted(self.ids_by_tag)}
+
+    def match(self, tags, mode: str = 'any') -> set[int]:
+        """Ids of goals carrying any (or, with mode='all', every one) of `tags`."""
+        sets = [self.ids_by_tag.get(t, set()) for t in tags]
+        if not sets:
+            return set()
+        if mode == 'all':
+            return set.intersection(*sets)
+        return set().union(*sets)
+
+
+@per_version
+@timed('view_model')
+def tag_index() -> TagIndex:
+    return TagIndex(read_goals())
+
+
+def goal_ids(tags: tuple = (), mode: str = 'any') -> set[int] | None:
+    """Goal ids passing the tag filter, or None when there is no filter."""
+    if not tags:
+        return None
+    return tag_index().match(tags, mode)
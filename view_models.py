@@ -0,0 +1,134 @@
+"""Columnar builders for the page payloads (goals table, mindmap, gantt, sankey).
+
+Everything here works on whole columns of the frames returned by
+read_goals()/read_relationships(); no per-row Python loops.
+"""
+from __future__ import annotations
+import pandas as pd
+
+def fmt_dates(s: pd.Series) -> pd.Series:
+    """ISO 'YYYY-MM-DD' strings for a column of dates; '' for blanks and junk."""
+    if s.empty:
+        return pd.Series([], index=s.index, dtype=object)
+    if pd.api.types.is_datetime64_any_dtype(s):
+        # Already parsed at load time (see excel_dal.SCHEMA)
+        return s.dt.strftime('%Y-%m-%d').fillna('').astype(object)
+    d = pd.to_datetime(s, errors='coerce', format='ISO8601')
+    # Non-ISO text (e.g. 31/12/2035) falls back to per-value parsing, as before
+    retry = d.isna() & s.notna() & (s.astype(str).str.strip() != '')
+    if retry.any():
+        d = d.copy()
+        d[retry] = pd.to_datetime(s[retry], errors='coerce', format='mixed')
+    return d.dt.strftime('%Y-%m-%d').fillna('').astype(object)
+
+def clean_text(s: pd.Series) -> pd.Series:
+    """Blank out NaN/None and literal 'nan' strings."""
+    out = s.astype(object).where(s.notna(), '')
+    return out.mask(out.astype(str).str.lower() == 'nan', '')
+
+def valid_goals(gs: pd.DataFrame) -> pd.DataFrame:
+    gs = gs[gs['id'].notna()].copy()
+    gs['id'] = gs['id'].astype(int)
+    return gs
+
+def visible_goals(gs: pd.DataFrame) -> pd.DataFrame:
+    # display == 0 means hidden; NaN/blank defaults to shown
+    gs = valid_goals(gs)
+    return gs[gs['display'].isna() | (gs['display'] != 0)]
+
+def valid_edges(rels: pd.DataFrame) -> pd.DataFrame:
+    rels = rels[['parent_id', 'child_id']].dropna()
+    return rels.astype(int)
+
+def edge_list(rels: pd.DataFrame) -> list[dict]:
+    return valid_edges(rels).rename(columns={'parent_id': 'parent', 'child_id': 'child'}).to_dict(orient='records')
+
+def goal_payload(gs: pd.DataFrame, fields: list[str]) -> list[dict]:
+    """Compact goal dicts for the chart views. fields from: id, name, start, due, tags."""
+    cols = {
+        'id': lambda: gs['id'],
+        'name': lambda: clean_text(gs['name']),
+        'start': lambda: fmt_dates(gs['start_date']),
+        'due': lambda: fmt_dates(gs['due_date']),
+        'tags': lambda: clean_text(gs['tags']),
+    }
+    return pd.DataFrame({f: cols[f]() for f in fields}, index=gs.index).to_dict(orient='records')
+
+def _names_by(edges: pd.DataFrame, key: str, other: str, names: pd.Series) -> pd.Series:
+    # Sorted, non-empty names of the linked goals, grouped by `key`
+    linked = edges.merge(names.rename('n'), left_on=other, right_index=True)
+    linked = linked[linked['n'] != ''].sort_values('n')
+    return linked.groupby(key)['n'].agg(list)
+
+def goal_rows(gs: pd.DataFrame, rels: pd.DataFrame) -> list[dict]:
+    """Rows for the /goals table, including parent/child name lists."""
+    return goal_rows_frame(gs, rels).to_dict(orient='records')
+
+def goal_rows_frame(gs: pd.DataFrame, rels: pd.DataFrame) -> pd.DataFrame:
+    gs = valid_goals(gs)
+    edges = valid_edges(rels)
+    names = clean_text(gs['name']).set_axis(gs['id'])
+    names = names[~names.index.duplicated(keep='last')]
+    children = _names_by(edges, 'parent_id', 'child_id', names)
+    parents = _names_by(edges, 'child_id', 'parent_id', names)
+    hidden = gs['display'].notna() & (gs['display'] == 0)
+    empty = pd.Series([[]] * len(gs), index=gs.index, dtype=object)
+    out = pd.DataFrame({
+        'id': gs['id'],
+        'name': clean_text(gs['name']),
+        'start_date': fmt_dates(gs['start_date']),
+        'start_date_disp': fmt_dates(gs['start_date']),
+        'due_date': fmt_dates(gs['due_date']),
+        'due_date_disp': fmt_dates(gs['due_date']),
+        'description': clean_text(gs['description']),
+        'display': hidden.map({True: 'No', False: 'Yes'}),
+        'display_value': gs['display'].fillna(1).astype(int),
+        'tags': clean_text(gs['tags']),
+        'children_names': gs['id'].map(children).where(gs['id'].isin(children.index), empty),
+        'parent_names': gs['id'].map(parents).where(gs['id'].isin(parents.index), empty),
+    }, index=gs.index)
+    return out.reset_index(drop=True)
+
+# Query-string keys for the /goals table -> goal row columns
+GOAL_TABLE_COLUMNS = {
+    'id': 'id', 'name': 'name', 'start': 'start_date_disp', 'due': 'due_date_disp',
+    'description': 'description', 'display': 'display', 'tags': 'tags',
+    'parents': 'parent_names', 'children': 'children_names',
+}
+
+def _column_text(rows: pd.DataFrame, col: str) -> pd.Series:
+    s = rows[col]
+    if col in ('parent_names', 'children_names'):
+        return s.str.join(', ')
+    return s.astype(str)
+
+def query_goal_rows(rows: pd.DataFrame, filters: dict[str, str] | None = None, sort: str = 'id',
+                    desc: bool = False, page: int = 1, limit: int = 100,
+                    ids: set[int] | None = None) -> tuple[list[dict], int]:
+    """One page of goal rows after case-insensitive 'contains' filters and a sort.
+
+    filters/sort use GOAL_TABLE_COLUMNS keys; blanks sort last either way. ids, if
+    given, limits the rows to those goals (e.g. a tag filter).
+    Returns (rows on the page, total matching rows).
+    """
+    mask = pd.Series(True, index=rows.index) if ids is None else rows['id'].isin(ids)
+    for key, text in (filters or {}).items():
+        if key in GOAL_TABLE_COLUMNS and text:
+            mask &= _column_text(rows, GOAL_TABLE_COLUMNS[key]).str.contains(text, case=False, regex=False)
+    out = rows[mask]
+    col = GOAL_TABLE_COLUMNS.get(sort, 'id')
+    if col == 'id':
+        out = out.sort_values('id', ascending=not desc, kind='stable')
+    else:
+        v = _column_text(out, col).str.lower()
+        out = out.assign(_blank=(v == ''), _v=v).sort_values(['_blank', '_v'], ascending=[True, not desc], kind='stable')
+        out = out.drop(columns=['_blank', '_v'])
+    start = (max(page, 1) - 1) * limit
+    return out.iloc[start:start + limit].to_dict(orient='records'), len(out)
+
+def hierarchy_maps(rels: pd.DataFrame) -> tuple[dict, dict]:
+    """(children_by_parent, parent_by_child); a child with several parents keeps the last one."""
+    edges = valid_edges(rels)
+    children_by_parent = edges.groupby('parent_id', sort=False)['child_id'].agg(list).to_dict()
+    parent_by_child = edges.drop_duplicates('child_id', keep='last').set_index('child_id')['parent_id'].to_dict()
+    return children_by_parent, parent_by_child